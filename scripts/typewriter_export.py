@@ -1,7 +1,8 @@
 import sys
 import rabj.simple as s
+from rabj.export import QueueExporter
 
-def export(start=0, num=None):
+def export(start=0, num=None, threads=4, checkpoint=None, output=None):
     if num == 0:
         return
 
@@ -11,30 +12,17 @@ def export(start=0, num=None):
     assert tq['name'] == "Typewriter"
     assert tq['owner'] == "/user/alexander"
 
-    batch = 5000
-    exported = 0
+    def progress(stats):
+        sys.stderr.write("Exported %(questions)i questions in %(chunks)i chunks, "
+                         "%(rate)0.1f questions/s\n" % stats)
 
-    while True:
-        limit = min(batch, num-exported)
-        offset = start+exported
-        sys.stderr.write("Exporting from index %i\n" %(offset, ))
-        resp, result = tq.queue.questions.complete.get(body=True, judgments=True, limit=limit, offset=offset)
-
-        for q in result['questions']:
-            sys.stdout.write(q.tojson())
-            sys.stdout.write("\n")
-        sys.stdout.flush()
-
-        if len(result) < limit:
-            break
-        
-        exported += len(result)
-        if num and exported >= num:
-            break
+    exporter = QueueExporter(tq, state='complete', chunksize=5000, threads=threads,
+                             checkpoint=checkpoint, start=start, num=num, progress=progress)
+    exporter.export(output or sys.stdout)
 
     
 def main(opts, args):
-    export(opts.start, opts.num)
+    export(opts.start, opts.num, opts.threads, opts.checkpoint, opts.output)
 
     return 0
     
@@ -47,6 +35,16 @@ if __name__ == '__main__':
 
     parser.add_option("-s", "--start", action="store", dest="start", type=int, default=0,
                       help="The starting point from where to export")
+
+    parser.add_option("-t", "--threads", action="store", dest="threads", type=int, default=4,
+                      help="The number of chunks to fetch concurrently")
+
+    parser.add_option("-c", "--checkpoint", action="store", dest="checkpoint",
+                      help="A file recording progress, an interrupted export resumes from it")
+
+    parser.add_option("-o", "--output", action="store", dest="output",
+                      help="The file to export to, default is stdout. Use with --checkpoint "
+                      "so a resumed export drops any partially written chunk")
                       
     opts, args = parser.parse_args()
     sys.exit(main(opts, args))
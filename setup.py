@@ -27,6 +27,7 @@ setup(name='pyrabj',
       description='Python client for rabj',
       url='https://wiki.metaweb.com/index.php/RABJ/client',
       install_requires=["httplib2 >= 0.5.0", ],
+      extras_require={"columnar": ["numpy>=1.15"], "matrix": ["numpy>=1.15", "scipy"], },
       package_dir={'': 'src'},
       packages=find_packages('src', exclude=["ez_setup"]),
       scripts=filter(executable, scripts_list)
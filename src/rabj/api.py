@@ -1,4 +1,4 @@
-import logging, httplib2, urllib
+import logging, httplib, httplib2, socket, threading, urllib, urlparse
 from rabj import VERSION, APP
 import util as u
 from util import json, EasyPeasyJsonEncoder
@@ -25,6 +25,175 @@ except LookupError:
             return codecs.lookup("ascii")
     codecs.register(find_idna)
 
+class RabjTransport(object):
+    """
+    A thread-safe pool of persistent HTTP connections to a single rabj
+    host. A :class:`httplib2.Http` instance keeps its connections alive
+    between requests but cannot be shared between threads, so the transport
+    checks out an idle instance for the duration of each request and returns
+    it to the pool afterwards. At most ``maxsize`` idle instances are kept
+    around; extra ones created under heavy concurrency are discarded.
+
+    Transports are normally obtained through :func:`transport_for` which
+    shares one transport between every :class:`RabjCallable` pointing at the
+    same host.
+
+    If ``cache`` is set to a :class:`~rabj.cache.ResponseCache`, GET
+    requests made through the transport are answered from and revalidated
+    against the cache. Similarly ``question_cache`` may hold a
+    :class:`~rabj.cache.QuestionCache` consulted by :mod:`rabj.simple` before
+    fetching a question by id.
+    """
+    def __init__(self, host_url, maxsize=20, timeout=None, cache=None, question_cache=None):
+        self.host_url = host_url
+        self.maxsize = maxsize
+        self.timeout = timeout
+        self.cache = cache
+        self.question_cache = question_cache
+        self._idle = []
+        self._idle_conns = {}
+        self._lock = threading.Lock()
+
+    def __repr__(self):
+        return "<%s@%s>" % (self.__class__.__name__, self.host_url)
+
+    def request(self, url, method, body, headers):
+        """Executes a HTTP request on a pooled connection and returns the
+        (response, content) pair from httplib2"""
+        http = self._acquire()
+        try:
+            resp, content = http.request(url, method, body, headers)
+        except Exception:
+            # the connection is in an unknown state, don't return it to the pool
+            self._discard(http)
+            raise
+
+        self._release(http)
+        return resp, content
+
+    def stream(self, url, method, body, headers):
+        """
+        Executes a HTTP request without reading the response body. Returns
+        a httplib2 response with the status and headers, a read(size)
+        function for the body and a close() function to call when done
+        with the body. The connection is returned to the pool only if the
+        body was read to the end.
+        """
+        scheme, netloc, path, query, fragment = urlparse.urlsplit(url)
+        if query:
+            path = path + '?' + query
+        key = (scheme, netloc)
+
+        conn = self._acquire_conn(key)
+        reused = conn is not None
+        while True:
+            if conn is None:
+                if scheme == 'https':
+                    conn = httplib.HTTPSConnection(netloc, timeout=self.timeout)
+                else:
+                    conn = httplib.HTTPConnection(netloc, timeout=self.timeout)
+            try:
+                conn.request(method, path, body, headers)
+                response = conn.getresponse()
+                break
+            except (httplib.HTTPException, socket.error):
+                conn.close()
+                if not reused:
+                    raise
+                # the server may have closed an idle connection, try a new one
+                conn, reused = None, False
+
+        def close():
+            if response.isclosed() and not response.will_close:
+                self._release_conn(key, conn)
+            else:
+                conn.close()
+
+        return httplib2.Response(response), response.read, close
+
+    def clear(self):
+        """Closes and drops all idle connections"""
+        self._lock.acquire()
+        try:
+            idle, self._idle = self._idle, []
+            idle_conns, self._idle_conns = self._idle_conns, {}
+        finally:
+            self._lock.release()
+
+        for http in idle:
+            self._discard(http)
+        for conns in idle_conns.values():
+            for conn in conns:
+                conn.close()
+
+    def _acquire_conn(self, key):
+        self._lock.acquire()
+        try:
+            conns = self._idle_conns.get(key)
+            if conns:
+                return conns.pop()
+            return None
+        finally:
+            self._lock.release()
+
+    def _release_conn(self, key, conn):
+        self._lock.acquire()
+        try:
+            conns = self._idle_conns.setdefault(key, [])
+            if len(conns) < self.maxsize:
+                conns.append(conn)
+                return
+        finally:
+            self._lock.release()
+
+        conn.close()
+
+    def _acquire(self):
+        self._lock.acquire()
+        try:
+            if self._idle:
+                return self._idle.pop()
+        finally:
+            self._lock.release()
+
+        return httplib2.Http(timeout=self.timeout)
+
+    def _release(self, http):
+        self._lock.acquire()
+        try:
+            if len(self._idle) < self.maxsize:
+                self._idle.append(http)
+                return
+        finally:
+            self._lock.release()
+
+        self._discard(http)
+
+    def _discard(self, http):
+        for conn in http.connections.values():
+            conn.close()
+        http.connections.clear()
+
+
+_transports = {}
+_transports_lock = threading.Lock()
+
+def transport_for(url):
+    """
+    Returns the shared :class:`RabjTransport` for the host of url, creating
+    it the first time the host is seen.
+    """
+    host_url = u.host_url(url)
+    transport = _transports.get(host_url)
+    if transport is None:
+        _transports_lock.acquire()
+        try:
+            transport = _transports.setdefault(host_url, RabjTransport(host_url))
+        finally:
+            _transports_lock.release()
+
+    return transport
+
 class RabjCallable(object):
     """
     A minimalist yet fully featured implementation to use the RABJ API. A
@@ -112,15 +281,27 @@ class RabjCallable(object):
         # fetch the list of users who have answered the second question
         >>> resp, qq2_users = completed_questions[2].users.get()
      
-        # fetch the list of judgments for all the completed questions
-        >>> fetches = [ q.judgments.get() for q in completed_questions ]
-        >>> judgments = [ result['judgments'] for (resp, result) in fetches ]        
+        # fetch the list of judgments for all the completed questions, see
+        # RabjQueue.judgments_for in rabj.simple for fetching them in bulk
+        >>> judgments = {}
+        >>> for qid, result, exc in queue.judgments_for(completed_questions):
+        ...     judgments[qid] = result
+
+    **Connections**
+
+    Every RabjCallable derived from another (by attribute or key access)
+    shares its :class:`RabjTransport`. Unless one is passed explicitly the
+    transport is looked up with :func:`transport_for`, so all callables,
+    containers and questions talking to a host reuse the same pool of
+    keep-alive connections and may be used from several threads.
     """
-    def __init__(self, url, access_key=None, *args, **kwargs):
+    __slots__ = ('_url', '_access_key', '_transport')
+
+    def __init__(self, url, access_key=None, transport=None, *args, **kwargs):
         super(RabjCallable, self).__init__(*args, **kwargs)
         self._url = url if url.endswith('/') else url + '/'
         self._access_key = access_key
-        self._http = httplib2.Http()
+        self._transport = transport if transport is not None else transport_for(self._url)
         
     def __repr__(self):
         return "<%s@%s>" % (self.__class__.__name__, self._url)
@@ -132,7 +313,14 @@ class RabjCallable(object):
             return self[attr]
     
     def __getitem__(self, key):
-        return RabjCallable(self._url+key, access_key=self._access_key)
+        return RabjCallable(self._url+key, access_key=self._access_key,
+                            transport=self._transport)
+
+    def for_path(self, path):
+        """The RabjCallable for the absolute path on the same host, Eg: a
+        question id. It shares the access key and transport of this one"""
+        return RabjCallable(u.host_url(self._url) + path, access_key=self._access_key,
+                            transport=self._transport)
     
     def get(self, **kwargs):
         """Execute a HTTP GET request on the current url. Additional
@@ -161,6 +349,35 @@ class RabjCallable(object):
         """        
         return self.response(*self.request_params(self._url, "DELETE", **kwargs))
 
+    def stream(self, path=('result', 'questions'), **kwargs):
+        """Execute a HTTP GET request on the current url and yield the
+        elements of the array at path in the response envelope as
+        :class:`~rabj.containers.RabjContainer` objects, decoding them one
+        at a time as they are read from the socket. Additional parameters
+        passed as kwargs will be added as query params.
+
+        The envelope status is checked once the array has been read, a
+        failed request raises a :class:`RabjError` as for :meth:`get`.
+        """
+        url, method, body, headers = self.request_params(self._url, "GET", **kwargs)
+        _log.debug("Streaming %s from url %s", method.lower(), url)
+        resp, read, close = self._transport.stream(url, method, body, headers)
+        try:
+            if resp.status != 200 or resp['content-type'] != 'application/json':
+                # not worth streaming, let RabjResponse raise the error
+                rabj_resp = RabjResponse(read(), resp, url)
+                for item in u.walk(rabj_resp.envelope, path):
+                    yield rabj_resp.container_factory.container(item, url)
+                return
+
+            decoder = u.JsonStreamDecoder(read, path)
+            container_factory = c.RabjContainerFactory.for_url(url)
+            for item in decoder:
+                yield container_factory.container(item, url)
+            RabjResponse.check(decoder.envelope)
+        finally:
+            close()
+
     def request_params(self, url, method, **kwargs):
         """
         Constructs the parameters for a http request
@@ -184,21 +401,55 @@ class RabjCallable(object):
         """
         Executes the request and wraps into a RabjResponse
         """
-        _log.debug("Sending %s to url %s", method.lower(), url)
-        resp, content = self._http.request(url, method, body, headers)
+        cache = self._transport.cache
+        if cache is None:
+            _log.debug("Sending %s to url %s", method.lower(), url)
+            resp, content = self._transport.request(url, method, body, headers)
+        elif method == "GET":
+            resp, content = self._cached_request(cache, url, method, body, headers)
+        else:
+            _log.debug("Sending %s to url %s", method.lower(), url)
+            resp, content = self._transport.request(url, method, body, headers)
+            cache.invalidate(url)
+
         rabj_resp = RabjResponse(content, resp, url)
         return rabj_resp, rabj_resp.result
 
+    def _cached_request(self, cache, url, method, body, headers):
+        """
+        Executes a GET request through cache, returning the cached response
+        while it is fresh and revalidating it once it is stale
+        """
+        cached = cache.lookup(url)
+        if cached is not None:
+            fresh, cached_resp, cached_content = cached
+            if fresh:
+                _log.debug("Serving %s from cache", url)
+                return cached_resp, cached_content
+            headers = dict(headers, **cache.conditional_headers(cached_resp))
+
+        _log.debug("Sending %s to url %s", method.lower(), url)
+        resp, content = self._transport.request(url, method, body, headers)
+        if resp.status == 304 and cached is not None:
+            cache.refresh(url, cached_resp, cached_content)
+            return cached_resp, cached_content
+        elif resp.status == 200:
+            cache.store(url, resp, content)
+        return resp, content
+
 import containers as c
 class RabjResponse(object):
     """Container for a response from rabj with convenience methods
     """
+    __slots__ = ('_url', 'http_resp', 'size', 'env', 'container_factory')
+
     def __init__(self, content, resp, url, *args, **kwargs):
         super(RabjResponse, self).__init__()
         self._url = url
         self.http_resp = resp
+        self.size = len(content)
         self.env = self._parse(resp, content)
-        self.container_factory = c.RabjContainerFactory(url)
+        self.container_factory = c.RabjContainerFactory.for_url(url)
         
     def __repr__(self):
         return "%s@%s" % (self.__class__.__name__, self._url)
@@ -224,19 +475,25 @@ class RabjResponse(object):
         operation as a rabj container
         """
         result = self.envelope['result']
-        return self.container_factory.container(result)
+        return self.container_factory.container(result, self._url)
         
+    @staticmethod
+    def check(envelope):
+        """Returns the decoded envelope if the status code indicates
+        success, raises a RabjError describing the failure otherwise
+        """
+        if envelope['status']['code'] == 200:
+            return envelope
+        else:
+            error = envelope['error']
+            raise RabjError(error['code'], error['class'], error['detail'], envelope)
+
     def _parse(self, resp, content):
         """Parses a rabj response to get the envelope information
         """
         if resp['content-type'] == 'application/json':
             try:
-                envelope = json.loads(content)
-                if envelope['status']['code']  == 200:
-                    return envelope
-                else:
-                    error = envelope['error']
-                    raise RabjError(error['code'], error['class'], error['detail'], envelope)
+                return self.check(json.loads(content))
             except ValueError, e:
                 _log.warn("Decode error %s in content %s", e, content)
                 raise RabjError(resp.status, resp.reason, {'msg': e.message}, content)
@@ -271,4 +528,24 @@ class RabjError(Exception):
         return self.env
 
 
-__all__ = [ 'RabjCallable', 'RabjResponse' , 'RabjError' ]
+class RabjBatchError(RabjError):
+    """Exception raised when some of the requests making up a bulk operation
+    failed. The results of the requests which succeeded are available in
+    results, the failures as a list of (batch, exc_info) tuples in
+    failures. Other fields are copied from the first failure.
+    """
+    def __init__(self, results, failures, total):
+        Exception.__init__(self)
+        self.results = results
+        self.failures = failures
+        first = failures[0][1][1]
+        self.env = getattr(first, 'env', None)
+        self.error_code = getattr(first, 'error_code', None)
+        self.error_class = getattr(first, 'error_class', first.__class__.__name__)
+        self.msg = "%i of %i batches failed, first failure: %s" % (len(failures), total, first)
+        self.alt = None
+        self.where = None
+
+
+__all__ = [ 'RabjCallable', 'RabjResponse' , 'RabjError', 'RabjBatchError',
+            'RabjTransport', 'transport_for' ]
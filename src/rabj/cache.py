@@ -0,0 +1,284 @@
+'''
+cache.py
+
+Bounded in-memory caches for responses from rabj
+'''
+import logging, re, threading, time
+from util import json
+
+_log = logging.getLogger("pyrabj.cache")
+
+class LRUCache(object):
+    """
+    A thread-safe mapping holding at most maxsize entries, evicting the least
+    recently used entry first. Entries older than ttl seconds are treated as
+    missing; a ttl of None keeps entries until they are evicted. If maxbytes
+    is given entries are also evicted once the sizes passed to :meth:`put`
+    add up to more than maxbytes; the total is available as ``bytes``.
+    """
+    def __init__(self, maxsize=1000, ttl=None, maxbytes=None):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.maxbytes = maxbytes
+        self.bytes = 0
+        self._entries = {}
+        # a circular doubly linked list of [prev, next, key], most recent first
+        self._root = root = []
+        root[:] = [root, root, None]
+        self._lock = threading.RLock()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def __contains__(self, key):
+        return self.get(key) is not None
+
+    def get(self, key, default=None):
+        """The value for key, default if it is missing or has expired"""
+        self._lock.acquire()
+        try:
+            entry = self._entries.get(key)
+            if entry is None:
+                return default
+            link, value, expires, size = entry
+            if expires is not None and expires < time.time():
+                self._remove(key)
+                return default
+            self._unlink(link)
+            self._link(link)
+            return value
+        finally:
+            self._lock.release()
+
+    def put(self, key, value, ttl=None, size=0):
+        """Stores value for key, optionally with its own ttl and with its
+        size counted against maxbytes"""
+        ttl = ttl if ttl is not None else self.ttl
+        expires = time.time() + ttl if ttl is not None else None
+        self._lock.acquire()
+        try:
+            if key in self._entries:
+                self._remove(key)
+            link = [None, None, key]
+            self._link(link)
+            self._entries[key] = (link, value, expires, size)
+            self.bytes += size
+            while len(self._entries) > self.maxsize or (self.maxbytes is not None and
+                                                        self.bytes > self.maxbytes):
+                self._evict()
+        finally:
+            self._lock.release()
+
+    def keys(self):
+        """A snapshot of the keys in the cache"""
+        self._lock.acquire()
+        try:
+            return list(self._entries)
+        finally:
+            self._lock.release()
+
+    def pop(self, key, default=None):
+        """Removes key and returns its value, default if it was missing"""
+        self._lock.acquire()
+        try:
+            if key not in self._entries:
+                return default
+            return self._remove(key)
+        finally:
+            self._lock.release()
+
+    def clear(self):
+        """Removes all entries"""
+        self._lock.acquire()
+        try:
+            self._entries.clear()
+            self._root[:] = [self._root, self._root, None]
+            self.bytes = 0
+        finally:
+            self._lock.release()
+
+    def _evict(self):
+        """Removes the least recently used entry"""
+        self._remove(self._root[0][2])
+
+    def _remove(self, key):
+        link, value, expires, size = self._entries.pop(key)
+        self._unlink(link)
+        self.bytes -= size
+        return value
+
+    def _link(self, link):
+        root = self._root
+        link[0], link[1] = root, root[1]
+        root[1][0] = link
+        root[1] = link
+
+    def _unlink(self, link):
+        link[0][1], link[1][0] = link[1], link[0]
+
+class ResponseCache(object):
+    """
+    A cache of GET responses used by :meth:`RabjCallable.response
+    <rabj.api.RabjCallable.response>`. Responses are revalidated with
+    If-None-Match and If-Modified-Since using the ETag and Last-Modified
+    headers they were served with, so an unchanged resource costs a 304
+    round trip rather than a full response. Within their time to live
+    responses are served without contacting the server at all.
+
+    maxsize
+        The maximum number of responses kept, least recently used first out
+
+    ttl
+        Seconds during which a response is served without revalidating it,
+        default is 0 (always revalidate)
+
+    ttls
+        A list of (regex, seconds) pairs overriding ttl for the urls whose
+        path matches regex, Eg: ``[(r'/status/$', 10)]``. The first match
+        wins
+
+    maxbytes
+        The maximum size in bytes of the responses kept, default is 32MB.
+        Larger responses are not cached. None is no limit
+
+    paths
+        A list of regexes, only the responses for urls whose path matches
+        one of them are cached, Eg: ``[r'/status/$']``. Default is None,
+        any url may be cached
+    """
+    def __init__(self, maxsize=1000, ttl=0, ttls=(), maxbytes=32*1024*1024, paths=None):
+        self.ttl = ttl
+        self.ttls = [ (re.compile(pattern), seconds) for pattern, seconds in ttls ]
+        self.maxbytes = maxbytes
+        self.paths = paths and [ re.compile(pattern) for pattern in paths ]
+        self._entries = LRUCache(maxsize, maxbytes=maxbytes)
+        self.hits = self.revalidated = self.misses = 0
+
+    def __len__(self):
+        return len(self._entries)
+
+    @property
+    def bytes(self):
+        """The size of the responses held"""
+        return self._entries.bytes
+
+    def lookup(self, url):
+        """
+        Returns (fresh, resp, content) for the cached response to url, or
+        None. fresh is True when the response may be used without
+        revalidation.
+        """
+        entry = self._entries.get(url)
+        if entry is None:
+            self.misses += 1
+            return None
+
+        resp, content, stored = entry
+        fresh = time.time() - stored < self.ttl_for(url)
+        if fresh:
+            self.hits += 1
+        return fresh, resp, content
+
+    def conditional_headers(self, resp):
+        """The validators to send when revalidating resp"""
+        headers = {}
+        if 'etag' in resp:
+            headers['If-None-Match'] = resp['etag']
+        if 'last-modified' in resp:
+            headers['If-Modified-Since'] = resp['last-modified']
+        return headers
+
+    def store(self, url, resp, content):
+        """Caches a successful response to url. Responses without a
+        validator are only cached if they have a time to live"""
+        if not self.conditional_headers(resp) and not self.ttl_for(url):
+            return
+        if self.maxbytes is not None and len(content) > self.maxbytes:
+            return
+        if self.paths is not None:
+            path = url.split('?', 1)[0]
+            if not [ pattern for pattern in self.paths if pattern.search(path) ]:
+                return
+        self._entries.put(url, (resp, content, time.time()), size=len(content))
+
+    def refresh(self, url, resp, content):
+        """Records that the cached resp and content for url were revalidated
+        by a 304"""
+        self.revalidated += 1
+        self._entries.put(url, (resp, content, time.time()), size=len(content))
+
+    def invalidate(self, url):
+        """Drops the cached responses which a write to url may have changed:
+        those for url, its query variants, and the urls above and below it"""
+        base = url.split('?', 1)[0]
+        for key in self._entries.keys():
+            key_base = key.split('?', 1)[0]
+            if base.startswith(key_base) or key_base.startswith(base):
+                self._entries.pop(key)
+
+    def clear(self):
+        self._entries.clear()
+
+    def ttl_for(self, url):
+        """The time to live of responses for url"""
+        path = url.split('?', 1)[0]
+        for pattern, seconds in self.ttls:
+            if pattern.search(path):
+                return seconds
+        return self.ttl
+
+class QuestionCache(object):
+    """
+    A cache of questions keyed by question id, used by
+    :class:`~rabj.simple.RabjQuestion`, :meth:`RabjQueue.get_one
+    <rabj.simple.RabjQueue.get_one>` and the bulk question fetches when set
+    on a server, see :class:`~rabj.simple.RabjServer`. Questions are kept as
+    json so every lookup returns a fresh copy which may be modified freely;
+    the bytes of json held can be bounded with maxbytes. Updating,
+    deleting, changing the state of or removing a question through pyrabj
+    refreshes or drops its entry.
+
+    maxsize
+        The maximum number of questions kept, least recently used first out
+
+    maxbytes
+        The maximum size in bytes of the questions kept, default is no limit
+
+    ttl
+        Seconds after which a question is fetched again, default is None
+        (until evicted or invalidated)
+    """
+    def __init__(self, maxsize=10000, maxbytes=None, ttl=None):
+        self._entries = LRUCache(maxsize, ttl, maxbytes)
+        self.hits = self.misses = 0
+
+    def __len__(self):
+        return len(self._entries)
+
+    @property
+    def bytes(self):
+        """The size of the questions held"""
+        return self._entries.bytes
+
+    def get(self, question_id):
+        """The question data (a dict) cached for question_id, None if it
+        isn't cached"""
+        cached = self._entries.get(question_id)
+        if cached is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        return json.loads(cached)
+
+    def put(self, question):
+        """Caches question, a question or its data"""
+        data = getattr(question, 'data', question)
+        cached = json.dumps(data)
+        self._entries.put(data['id'], cached, size=len(cached))
+
+    def invalidate(self, question_id):
+        """Drops the question question_id"""
+        self._entries.pop(question_id)
+
+    def clear(self):
+        self._entries.clear()
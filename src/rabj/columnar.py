@@ -0,0 +1,294 @@
+'''
+columnar.py
+
+Columnar storage of judgments. Question ids, judges and values are coded as
+integers and kept in NumPy arrays so that statistics over millions of
+judgments are array operations rather than loops over tuples.
+'''
+import array, logging, os
+from util import json
+
+try:
+    import numpy
+except ImportError:
+    """numpy is optional (and unavailable on Jython), columnar judgments
+    are unavailable without it."""
+    numpy = None
+
+try:
+    import scipy.sparse
+except ImportError:
+    """scipy is optional, judgment matrices are unavailable without it."""
+    scipy = None
+
+_log = logging.getLogger("pyrabj.columnar")
+
+def judgment_value(judgment):
+    """The value of a judgment, ``reconciled:<recon_id>`` for reconciled
+    judgments"""
+    value = judgment['value']
+    if value == 'reconciled':
+        return "%s:%s" % (value, judgment['__metadata__']['recon_id'])
+    return value
+
+def judgment_tuples(questions, min=1):
+    """
+    Iterates over the judgments of questions with at least min judgments as
+    (qid, fb_user_id, value) tuples. The raw question data is read, without
+    wrapping the judgments in containers.
+    """
+    for question in questions:
+        data = getattr(question, 'data', question)
+        judgments = data.get('judgments') or ()
+        if len(judgments) < min:
+            continue
+
+        qid = data['id']
+        for judgment in judgments:
+            yield qid, judgment['user']['fb_user_id'], judgment_value(judgment)
+
+class Coding(object):
+    """
+    A dictionary mapping values to consecutive integer codes, in the order
+    the values were first seen. Values must be hashable.
+    """
+    def __init__(self, values=()):
+        self.values = []
+        self._codes = {}
+        for value in values:
+            self.encode(value)
+
+    def __repr__(self):
+        return "<%s of %i values>" % (self.__class__.__name__, len(self.values))
+
+    def __len__(self):
+        return len(self.values)
+
+    def __iter__(self):
+        return iter(self.values)
+
+    def __contains__(self, value):
+        return value in self._codes
+
+    def encode(self, value):
+        """The code for value, adding it if it hasn't been seen"""
+        code = self._codes.get(value)
+        if code is None:
+            code = self._codes[value] = len(self.values)
+            self.values.append(value)
+        return code
+
+    def code(self, value):
+        """The code for value, raises KeyError if it hasn't been seen"""
+        return self._codes[value]
+
+    def decode(self, code):
+        """The value for code"""
+        return self.values[code]
+
+    def decode_all(self, codes):
+        """The values for an array of codes, as a list"""
+        values = self.values
+        return [ values[code] for code in codes ]
+
+class JudgmentColumns(object):
+    """
+    Judgments as three parallel arrays of integer codes: ``questions``,
+    ``judges`` and ``values``, with the :class:`Coding` for each column in
+    ``question_coding``, ``judge_coding`` and ``value_coding``. Row i is
+    the judgment by judge ``judge_coding.decode(judges[i])`` on question
+    ``question_coding.decode(questions[i])``.
+
+    >>> tuples = convenience.export_judgments_as_tuples(server, queue_id, key, 'complete')
+    >>> columns = JudgmentColumns.from_tuples(tuples)
+    >>> columns.save('/var/tmp/judgments')
+    >>> columns = JudgmentColumns.load('/var/tmp/judgments', mmap_mode='r')
+    >>> votes_per_question = numpy.bincount(columns.questions)
+    """
+    columns = ('questions', 'judges', 'values')
+    dtype = 'int32'
+
+    def __init__(self, questions, judges, values, question_coding, judge_coding, value_coding):
+        if numpy is None:
+            raise ImportError("JudgmentColumns requires numpy")
+        if not len(questions) == len(judges) == len(values):
+            raise ValueError("Columns of different lengths: %i, %i, %i" %
+                             (len(questions), len(judges), len(values)))
+
+        self.questions = questions
+        self.judges = judges
+        self.values = values
+        self.question_coding = question_coding
+        self.judge_coding = judge_coding
+        self.value_coding = value_coding
+
+    def __repr__(self):
+        return "<%s of %i judgments, %i questions, %i judges, %i values>" % (
+            self.__class__.__name__, len(self), len(self.question_coding),
+            len(self.judge_coding), len(self.value_coding))
+
+    def __len__(self):
+        return len(self.questions)
+
+    def __iter__(self):
+        """Iterates over the judgments as decoded (qid, judge, value)
+        tuples"""
+        qvalues = self.question_coding.values
+        jvalues = self.judge_coding.values
+        vvalues = self.value_coding.values
+        for q, j, v in zip(self.questions.tolist(), self.judges.tolist(), self.values.tolist()):
+            yield qvalues[q], jvalues[j], vvalues[v]
+
+    @classmethod
+    def from_tuples(cls, tuples):
+        """
+        Builds the columns from an iterable of (qid, judge, value) tuples
+        such as the output of
+        :func:`~rabj.convenience.export_judgments_as_tuples`. Codes are
+        accumulated in compact arrays, the tuples are never held in memory.
+        """
+        if numpy is None:
+            raise ImportError("JudgmentColumns requires numpy")
+
+        qcoding, jcoding, vcoding = Coding(), Coding(), Coding()
+        qcodes, jcodes, vcodes = array.array('i'), array.array('i'), array.array('i')
+        qencode, jencode, vencode = qcoding.encode, jcoding.encode, vcoding.encode
+        for qid, judge, value in tuples:
+            qcodes.append(qencode(qid))
+            jcodes.append(jencode(judge))
+            vcodes.append(vencode(value))
+
+        _log.info("Encoded %i judgments of %i questions by %i judges",
+                  len(qcodes), len(qcoding), len(jcoding))
+        return cls(cls._column(qcodes), cls._column(jcodes), cls._column(vcodes),
+                   qcoding, jcoding, vcoding)
+
+    @classmethod
+    def from_questions(cls, questions, min=1):
+        """Builds the columns from the judgments of questions with at least
+        min judgments, see :func:`judgment_tuples`"""
+        return cls.from_tuples(judgment_tuples(questions, min))
+
+    @classmethod
+    def from_queue(cls, queue, state='complete', min=1, pagesize=5000, stream=True):
+        """
+        Builds the columns from the judgments of the questions in state on
+        queue. The questions are streamed from :meth:`RabjQueue.iter_all
+        <rabj.simple.RabjQueue.iter_all>` without their bodies and, unless
+        stream is False, decoded one at a time rather than a page at a time.
+        """
+        questions = queue.iter_all(state=state, body=False, judgments=True, pagesize=pagesize,
+                                   stream=stream)
+        return cls.from_questions(questions, min)
+
+    @classmethod
+    def _column(cls, codes):
+        """Converts an array.array of codes to a numpy array"""
+        return numpy.frombuffer(codes, dtype=numpy.intc).astype(cls.dtype)
+
+    def select(self, mask):
+        """The judgments selected by mask, a boolean array or an array of
+        row indices. The codings are shared with the selection"""
+        return self.__class__(self.questions[mask], self.judges[mask], self.values[mask],
+                              self.question_coding, self.judge_coding, self.value_coding)
+
+    def matrix(self, format='csr'):
+        """
+        The judgments as a sparse question x judge matrix (a scipy.sparse
+        matrix in format, Eg: 'csr', 'csc' or 'coo'). Rows are question
+        codes, columns judge codes and entries value codes plus one, so that
+        zero means not judged. When a judge judged a question more than once
+        the last judgment is kept. Requires scipy.
+        """
+        if scipy is None:
+            raise ImportError("Judgment matrices require scipy")
+
+        rows = numpy.asarray(self.questions)
+        cols = numpy.asarray(self.judges)
+        data = numpy.asarray(self.values) + 1
+        shape = (len(self.question_coding), len(self.judge_coding))
+
+        # coo to csr conversion sums duplicate entries, keep the last instead
+        cells = rows.astype(numpy.int64) * max(shape[1], 1) + cols
+        unique, last = numpy.unique(cells[::-1], return_index=True)
+        if len(unique) < len(cells):
+            keep = len(cells) - 1 - last
+            rows, cols, data = rows[keep], cols[keep], data[keep]
+
+        matrix = scipy.sparse.coo_matrix((data, (rows, cols)), shape=shape)
+        return matrix.asformat(format)
+
+    def save(self, path, compressed=False):
+        """
+        Saves the columns to path. A path ending in .npz is saved as a
+        single (optionally compressed) archive, any other path as a
+        directory holding one .npy file per column, which :meth:`load` can
+        memory map.
+        """
+        codings = self._codings()
+        if path.endswith('.npz'):
+            savez = numpy.savez_compressed if compressed else numpy.savez
+            arrays = dict(codings)
+            for name in self.columns:
+                arrays[name] = getattr(self, name)
+            savez(path, **arrays)
+        else:
+            if not os.path.isdir(path):
+                os.makedirs(path)
+            for name in self.columns:
+                numpy.save(os.path.join(path, name + '.npy'), getattr(self, name))
+            for name, coding in codings:
+                numpy.save(os.path.join(path, name + '.npy'), coding)
+        _log.info("Saved %i judgments to %s", len(self), path)
+
+    @classmethod
+    def load(cls, path, mmap_mode=None):
+        """
+        Loads columns saved by :meth:`save`. mmap_mode (Eg: 'r') memory maps
+        the columns of a directory rather than reading them, it is ignored
+        for .npz archives.
+        """
+        if numpy is None:
+            raise ImportError("JudgmentColumns requires numpy")
+
+        if path.endswith('.npz'):
+            archive = numpy.load(path)
+            try:
+                arrays = dict((name, archive[name]) for name in archive.files)
+            finally:
+                archive.close()
+        else:
+            arrays = {}
+            for name in cls.columns:
+                arrays[name] = numpy.load(os.path.join(path, name + '.npy'), mmap_mode=mmap_mode)
+            for name in cls._coding_names():
+                arrays[name] = numpy.load(os.path.join(path, name + '.npy'))
+
+        codings = [ Coding([ json.loads(value) for value in arrays[name].tolist() ])
+                    for name in cls._coding_names() ]
+        return cls(*([ arrays[name] for name in cls.columns ] + codings))
+
+    @classmethod
+    def _coding_names(cls):
+        return [ name + '_coding' for name in cls.columns ]
+
+    def _codings(self):
+        """The codings as (name, array) pairs. Values are stored as json
+        strings so that loading them doesn't need pickle"""
+        codings = (self.question_coding, self.judge_coding, self.value_coding)
+        return [ (name, numpy.array([ unicode(json.dumps(value)) for value in coding ],
+                                    dtype=numpy.unicode_))
+                 for name, coding in zip(self._coding_names(), codings) ]
+
+def judgment_matrix(queue, state='complete', min=1, format='csr', pagesize=5000):
+    """
+    Builds the sparse question x judge matrix of the judgments on queue,
+    see :meth:`JudgmentColumns.matrix`. Returns the matrix and the
+    :class:`JudgmentColumns` it was built from, whose codings map between
+    matrix indices and qids, fb_user_ids and values.
+
+    >>> matrix, columns = judgment_matrix(queue)
+    >>> judge = columns.judge_coding.decode(matrix[0].indices[0])
+    """
+    columns = JudgmentColumns.from_queue(queue, state, min, pagesize)
+    return columns.matrix(format), columns
@@ -0,0 +1,252 @@
+'''
+consensus.py
+
+Consensus answers and inter-annotator agreement computed over
+:class:`~rabj.columnar.JudgmentColumns` with array operations.
+'''
+import logging
+import columnar
+
+numpy = columnar.numpy
+
+_log = logging.getLogger("pyrabj.consensus")
+
+RECONCILED = 'reconciled'
+
+class Consensus(object):
+    """
+    Vote counts, consensus answers and agreement statistics for a set of
+    judgments. The votes are tallied once, as a sparse table of (question,
+    value, count) rows, and every statistic is computed from the table.
+
+    >>> consensus = Consensus(convenience.export_judgments_as_columns(
+    ...     server, queue_id, access_key, 'complete'))
+    >>> answers = consensus.answers()
+    >>> print consensus.fleiss_kappa()
+
+    columns
+        The :class:`~rabj.columnar.JudgmentColumns` to analyse
+
+    collapse_reconciled
+        Count the ``reconciled:<recon_id>`` values as a single 'reconciled'
+        answer, the default. See :meth:`reconciled` for the breakdown by
+        recon_id
+    """
+    def __init__(self, columns, collapse_reconciled=True):
+        if numpy is None:
+            raise ImportError("Consensus requires numpy")
+
+        self.columns = columns
+        self.collapse_reconciled = collapse_reconciled
+        if collapse_reconciled:
+            self.value_coding, remap = self._collapse(columns.value_coding)
+            self.values = remap[columns.values]
+        else:
+            self.value_coding = columns.value_coding
+            self.values = numpy.asarray(columns.values)
+        self.questions = numpy.asarray(columns.questions)
+        self.judges = numpy.asarray(columns.judges)
+        self.nquestions = len(columns.question_coding)
+        self.njudges = len(columns.judge_coding)
+        self.nvalues = len(self.value_coding)
+        self._votes = None
+
+    def __repr__(self):
+        return "<%s of %i judgments>" % (self.__class__.__name__, len(self.values))
+
+    @staticmethod
+    def _collapse(coding):
+        """A coding with the reconciled values merged and the array mapping
+        the codes of coding to it"""
+        collapsed = columnar.Coding()
+        remap = numpy.empty(len(coding), dtype=columnar.JudgmentColumns.dtype)
+        for code, value in enumerate(coding):
+            if _is_reconciled(value):
+                value = RECONCILED
+            remap[code] = collapsed.encode(value)
+        return collapsed, remap
+
+    def votes(self):
+        """
+        The vote distribution as three arrays ``(questions, values,
+        counts)``: counts[i] judges gave value code values[i] to question
+        code questions[i]. Rows are sorted by question then value.
+        """
+        if self._votes is None:
+            pairs = self.questions.astype(numpy.int64) * max(self.nvalues, 1) + self.values
+            pairs, counts = numpy.unique(pairs, return_counts=True)
+            nvalues = max(self.nvalues, 1)
+            self._votes = (pairs // nvalues, pairs % nvalues, counts)
+        return self._votes
+
+    def votes_per_question(self):
+        """The number of judgments of each question, indexed by question
+        code"""
+        return numpy.bincount(self.questions, minlength=self.nquestions)
+
+    def plurality(self):
+        """
+        The most frequent value of each question as three arrays indexed by
+        question code: the value code (-1 for questions without judgments),
+        its number of votes and whether it is tied with another value. Ties
+        are broken by the lowest value code.
+        """
+        questions, values, counts = self.votes()
+        # sort by question, then by count descending: the first row of each
+        # question is its plurality value
+        order = numpy.lexsort((-counts, questions))
+        questions, values, counts = questions[order], values[order], counts[order]
+        first = numpy.ones(len(questions), dtype=bool)
+        first[1:] = questions[1:] != questions[:-1]
+
+        answers = numpy.full(self.nquestions, -1, dtype=numpy.int64)
+        top = numpy.zeros(self.nquestions, dtype=numpy.int64)
+        answers[questions[first]] = values[first]
+        top[questions[first]] = counts[first]
+
+        # a tie if the runner up of the question has as many votes
+        second = numpy.zeros(len(questions), dtype=bool)
+        second[1:] = ~first[1:]
+        second[1:] &= first[:-1]
+        tied = numpy.zeros(self.nquestions, dtype=bool)
+        tied[questions[second]] = counts[second] == top[questions[second]]
+        return answers, top, tied
+
+    def majority(self):
+        """The value of each question chosen by more than half its judges,
+        indexed by question code, -1 where there is no majority"""
+        answers, top, tied = self.plurality()
+        answers = answers.copy()
+        answers[2 * top <= self.votes_per_question()] = -1
+        return answers
+
+    def answers(self, method='majority'):
+        """The consensus answers as a dict of qid to value. method is
+        'majority' or 'plurality' (ties are left out)"""
+        if method == 'majority':
+            codes = self.majority()
+        elif method == 'plurality':
+            codes, top, tied = self.plurality()
+            codes = numpy.where(tied, -1, codes)
+        else:
+            raise ValueError("Unknown consensus method %r" % (method, ))
+
+        questions = numpy.flatnonzero(codes >= 0)
+        return dict(zip(self.columns.question_coding.decode_all(questions.tolist()),
+                        self.value_coding.decode_all(codes[questions].tolist())))
+
+    def fleiss_kappa(self):
+        """
+        Fleiss' kappa over the questions with at least two judgments,
+        generalised to a varying number of judgments per question. Returns
+        nan if there are no such questions.
+        """
+        questions, values, counts = self.votes()
+        n = self.votes_per_question().astype(numpy.float64)
+        rated = n >= 2
+        if not rated.any():
+            return float('nan')
+
+        keep = rated[questions]
+        questions, values, counts = questions[keep], values[keep], counts[keep]
+        counts = counts.astype(numpy.float64)
+
+        sumsq = numpy.bincount(questions, weights=counts * counts, minlength=self.nquestions)
+        n = n[rated]
+        observed = ((sumsq[rated] - n) / (n * (n - 1))).mean()
+
+        shares = numpy.bincount(values, weights=counts, minlength=self.nvalues) / n.sum()
+        expected = (shares * shares).sum()
+        if expected == 1.0:
+            return 1.0 if observed == 1.0 else float('nan')
+        return (observed - expected) / (1.0 - expected)
+
+    def cohen_kappa(self, judge_a, judge_b):
+        """
+        Cohen's kappa between two judges (fb_user_ids) over the questions
+        both judged. Returns nan if they have no questions in common.
+        """
+        coding = self.columns.judge_coding
+        qa, va = self._judged_by(coding.code(judge_a))
+        qb, vb = self._judged_by(coding.code(judge_b))
+        common, ia, ib = numpy.intersect1d(qa, qb, assume_unique=True, return_indices=True)
+        if not len(common):
+            return float('nan')
+
+        va, vb = va[ia], vb[ib]
+        observed = (va == vb).mean()
+        pa = numpy.bincount(va, minlength=self.nvalues) / float(len(common))
+        pb = numpy.bincount(vb, minlength=self.nvalues) / float(len(common))
+        expected = (pa * pb).sum()
+        if expected == 1.0:
+            return 1.0 if observed == 1.0 else float('nan')
+        return (observed - expected) / (1.0 - expected)
+
+    def _judged_by(self, judge):
+        """The question codes judged by judge and its values, keeping its
+        first judgment of each question"""
+        rows = numpy.flatnonzero(self.judges == judge)
+        questions, first = numpy.unique(self.questions[rows], return_index=True)
+        return questions, self.values[rows[first]]
+
+    def judge_accuracy(self, consensus=None):
+        """
+        The agreement of every judge with the consensus as two arrays
+        indexed by judge code: the fraction of their judgments matching the
+        consensus answer and the number of judgments compared. Only
+        questions with a consensus count. consensus defaults to
+        :meth:`majority`; the accuracy of judges without any compared
+        judgments is nan.
+        """
+        if consensus is None:
+            consensus = self.majority()
+        expected = consensus[self.questions]
+        compared = expected >= 0
+        judges = self.judges[compared]
+        correct = (self.values[compared] == expected[compared]).astype(numpy.float64)
+
+        judged = numpy.bincount(judges, minlength=self.njudges)
+        agreed = numpy.bincount(judges, weights=correct, minlength=self.njudges)
+        accuracy = numpy.full(self.njudges, numpy.nan)
+        numpy.divide(agreed, judged, out=accuracy, where=judged > 0)
+        return accuracy, judged
+
+    def judge_accuracies(self, consensus=None):
+        """:meth:`judge_accuracy` as a dict of fb_user_id to (accuracy,
+        judgments compared), for the judges with any compared"""
+        accuracy, judged = self.judge_accuracy(consensus)
+        judges = numpy.flatnonzero(judged)
+        return dict(zip(self.columns.judge_coding.decode_all(judges.tolist()),
+                        zip(accuracy[judges].tolist(), judged[judges].tolist())))
+
+    def reconciled(self):
+        """
+        The breakdown of the reconciled judgments as a dict of recon_id to
+        (judgments, questions): the number of reconciled judgments with
+        that recon_id and the number of questions they were given on.
+        """
+        coding = self.columns.value_coding
+        recon_ids = {}
+        for code, value in enumerate(coding):
+            if _is_reconciled(value):
+                recon_ids[code] = value[len(RECONCILED) + 1:]
+        if not recon_ids:
+            return {}
+
+        values = numpy.asarray(self.columns.values)
+        codes = numpy.array(sorted(recon_ids), dtype=values.dtype)
+        rows = numpy.flatnonzero(numpy.in1d(values, codes))
+        judgments = numpy.bincount(values[rows], minlength=len(coding))
+        pairs = numpy.unique(self.questions[rows].astype(numpy.int64) * len(coding) + values[rows])
+        questions = numpy.bincount(pairs % len(coding), minlength=len(coding))
+
+        breakdown = {}
+        for code, recon_id in recon_ids.items():
+            if judgments[code]:
+                breakdown[recon_id] = (int(judgments[code]), int(questions[code]))
+        return breakdown
+
+def _is_reconciled(value):
+    """True for the reconciled:<recon_id> values of
+    :func:`~rabj.convenience.export_judgments_as_tuples`"""
+    return isinstance(value, basestring) and value.startswith(RECONCILED + ':')
@@ -15,43 +15,146 @@ except ImportError:
     collections module. They are copied to the jycompat module."""
     from jycompat.collections import MutableSequence, MutableMapping
 
+def _slotted(abc):
+    """
+    Returns a class with the mixin methods of the collection ABC abc and
+    empty __slots__. The ABCs do not declare __slots__ themselves, so
+    inheriting from them directly would give every container a __dict__.
+    Classes using the mixin are registered with the ABC instead.
+    """
+    methods = {}
+    for klass in reversed(abc.__mro__[:-1]):
+        for name, value in vars(klass).items():
+            if name.startswith('_abc_') or name in ('__dict__', '__weakref__', '__module__',
+                                                    '__doc__', '__metaclass__',
+                                                    '__abstractmethods__',
+                                                    '__subclasshook__'):
+                continue
+            methods[name] = value
+    methods['__slots__'] = ()
+    return type('_Slotted%s' % abc.__name__, (object, ), methods)
+
 class RabjContainerFactory(object):
+    """Wraps objects from rabj responses in containers. Lists are wrapped
+    with the url passed to :meth:`container`, or the url of the factory.
+    One factory is shared by all the containers for a host, see
+    :meth:`for_url`."""
+    __slots__ = ('url', 'host_url', 'path')
+    _factories = {}
+
     def __init__(self, url):
         self.url = url
         self.host_url = u.host_url(url)
         self.path = u.path(url)
 
-    def container(self, obj):
+    @classmethod
+    def for_url(cls, url):
+        """The shared factory for the host of url"""
+        host_url = u.host_url(url)
+        factory = cls._factories.get(host_url)
+        if factory is None:
+            factory = cls._factories.setdefault(host_url, cls(host_url))
+        return factory
+
+    def container(self, obj, url=None):
+        """Wraps obj found at url, default is the url of the factory"""
         if isinstance(obj, dict):
             # A dict response may be a rabj object with an id. If so, set the
             # path to be the id of the returned object
             if 'id' in obj:
-                return RabjDict(obj, "%s%s" % (self.host_url, obj['id']))
+                return RabjDict(obj, "%s%s" % (self.host_url, obj['id']), self)
             else:
                 return obj
         elif isinstance(obj, list):
-            return RabjList(obj, self.url)
+            return RabjList(obj, url if url is not None else self.url, self)
         else:
             return obj
 
 class RabjContainer(object):
-    """Abstract container for Rabj data."""
+    """Abstract container for Rabj data. Wrapped items are cached so that
+    repeated access returns the same object.
 
-    def __init__(self, data, url, *args, **kwargs):
+    Containers record the keys set or deleted through them in ``dirty``.
+    Changes made through a wrapped item mark the key holding it in its
+    container, so ``question['tags'].append(tag)`` marks 'tags' as dirty.
+    Changes made to plain dicts and lists inside the data are not seen."""
+    __slots__ = ('data', 'url', '_container_factory', '_children', '_dirty', '_owner')
+
+    def __init__(self, data, url, container_factory=None, *args, **kwargs):
         """Initializer for a new rabj container. The only argument is the data
         object contained"""
         super(RabjContainer, self).__init__()
         self.data = data
         self.url = url
-        self.container_factory = RabjContainerFactory(self.url)
+        self._container_factory = container_factory
+        self._children = None
+        self._dirty = None
+        self._owner = None
 
     def copy_from_other(self, other):
         """
-        Soft-copies data from another container to this container
+        Soft-copies data from another container to this container. The copy
+        starts with its own wrapper cache and belongs to no container, so
+        changes made through it are recorded on the copy only
         """
         self.data = other.data
         self.url = other.url
-        self.container_factory = other.container_factory
+        self._container_factory = other._container_factory
+        self._children = None
+        self._dirty = set(other._dirty) if other._dirty else None
+        self._owner = None
+
+    @property
+    def dirty(self):
+        """The keys changed since the data was loaded or last marked clean"""
+        return frozenset(self._dirty or ())
+
+    def mark_clean(self):
+        """Forgets the changes recorded in dirty"""
+        self._dirty = None
+
+    def _changed(self, key):
+        """Records a change to key, and to the key holding this container
+        in its owner"""
+        if self._dirty is None:
+            self._dirty = set()
+        self._dirty.add(key)
+        if self._owner is not None:
+            owner, owner_key = self._owner
+            owner._changed(owner_key)
+
+    @property
+    def container_factory(self):
+        """The factory wrapping items of this container, shared by all the
+        containers for the same host"""
+        if self._container_factory is None:
+            self._container_factory = RabjContainerFactory.for_url(self.url)
+        return self._container_factory
+
+    def _child(self, key):
+        """Returns the item at key wrapped by the container factory. Wrapped
+        containers are cached for as long as the item at key is unchanged"""
+        item = self.data[key]
+        if self._children is None:
+            self._children = {}
+        else:
+            child = self._children.get(key)
+            if child is not None and child.data is item:
+                return child
+
+        child = self.container_factory.container(item, self.url)
+        if isinstance(child, RabjContainer):
+            child._owner = (self, key)
+            self._children[key] = child
+        return child
+
+    def _forget(self, key=None):
+        """Drops the cached wrapper for key, or all of them"""
+        if self._children:
+            if key is None:
+                self._children.clear()
+            else:
+                self._children.pop(key, None)
 
     def __repr__(self):
         return repr(self.data)
@@ -71,7 +174,7 @@ class RabjContainer(object):
         return self.data
 
 from rabj.api import RabjCallable
-class RabjDict(RabjContainer, MutableMapping):
+class RabjDict(RabjContainer, _slotted(MutableMapping)):
     """Mapping container for rabj responses. Finds urls within the rabj
     response and converts them into RabjCallables The RabjDict itself is a
     RabjCallable object and provides access to HTTP methods on the url which
@@ -90,39 +193,68 @@ class RabjDict(RabjContainer, MutableMapping):
     >>> myqueue = RabjDict(result=None, url=my_queue_url)
     >>> # equivalent to a HTTP GET on my_queue_url+'/judgments'
     >>> myqueue.judgments.get()
+
+    The RabjCallable is only created the first time the URL space or an
+    HTTP method is used, so holding many RabjDicts costs little more than
+    holding the dicts they wrap.
     """
-    def __init__(self, result, url, *args, **kwargs):
+    __slots__ = ('_rabjcallable', )
+
+    def __init__(self, result, url, container_factory=None, *args, **kwargs):
         """Initializes a RabjDict object. The result is the mapping object and
         the url is the remote location of the object."""
-        super(RabjDict, self).__init__(data=result, url=url, *args, **kwargs)
-
-        access_key = self.data.get('__metadata__', {}).get('access_key', self.data.get('access_key'))
-        self.rabjcallable = RabjCallable(url, access_key)
+        super(RabjDict, self).__init__(result, url, container_factory, *args, **kwargs)
+        self._rabjcallable = None
 
     def copy_from_other(self, other):
       """Copy from a rabj dict from another"""
       super(RabjDict, self).copy_from_other(other)
-      self.rabjcallable = other.rabjcallable
+      self._rabjcallable = other._rabjcallable
+
+    @property
+    def rabjcallable(self):
+        """The RabjCallable for the url of this dict, created on first use"""
+        if self._rabjcallable is None:
+            access_key = self.data.get('__metadata__', {}).get('access_key', self.data.get('access_key'))
+            self._rabjcallable = RabjCallable(self.url, access_key)
+        return self._rabjcallable
     
     def __getattr__(self, attr):
         """The method which provides attribute like access to the URL space."""
+        if attr in _slot_names:
+            # an unset slot, don't look for it in the URL space
+            raise AttributeError(attr)
         return getattr(self.rabjcallable, attr)
 
     def __getitem__(self, key):
         """The method which provides key like access to the URL space."""
         try:
-            item = self.data[key]
-            return self.container_factory.container(item)
+            return self._child(key)
         except KeyError, e:
             return self.rabjcallable[key]
 
     def __setitem__(self, key, item):
         """Dict-like setitem method"""
+        self._forget(key)
         self.data[key] = item
+        self._changed(key)
 
     def __delitem__(self, key):
         """Dict-like delitem method"""
+        self._forget(key)
         del self.data[key]
+        self._changed(key)
+
+    def changes(self):
+        """
+        The changed fields as a dict, holding the id (if any) and the
+        current value of each dirty key. Deleted keys map to None.
+        """
+        data = self.data
+        changes = dict((key, data.get(key)) for key in self.dirty)
+        if 'id' in data:
+            changes['id'] = data['id']
+        return changes
 
     def http_get(self, **kwargs):
         """Invokes a HTTP get on the URL contained in the RabjCallable in this
@@ -155,7 +287,7 @@ class RabjDict(RabjContainer, MutableMapping):
         """Length of the dict"""
         return len(self.data)
 
-class RabjList(RabjContainer, MutableSequence):
+class RabjList(RabjContainer, _slotted(MutableSequence)):
     """Sequence container for rabj responses. Elements of the list which are
     dicts having an 'id' field are transformed into RabjDicts.
 
@@ -163,21 +295,38 @@ class RabjList(RabjContainer, MutableSequence):
     idea is the same -- facilitating access to the Rabj API in an object-like
     manner.
     """
-    def __init__(self, result, url, *args, **kwargs):
-        super(RabjList, self).__init__(data=result, url=url, *args, **kwargs)
+    __slots__ = ()
+
+    def __init__(self, result, url, container_factory=None, *args, **kwargs):
+        super(RabjList, self).__init__(result, url, container_factory, *args, **kwargs)
 
     def __getitem__(self, i):
-        item = self.data[i]
-        return self.container_factory.container(item)
+        if isinstance(i, slice):
+            return self.container_factory.container(self.data[i], self.url)
+        if i < 0:
+            if i < -len(self.data):
+                raise IndexError("list index out of range")
+            i += len(self.data)
+        return self._child(i)
 
     def __setitem__(self, i, item):
+        self._forget()
         self.data[i] = item
+        self._changed(i)
 
     def __delitem__(self, i):
+        self._forget()
         del self.data[i]
+        self._changed(i)
 
     def __len__(self):
         return len(self.data)
 
     def insert(self, i, item):
-        return self.data.insert(i, item)
+        self._forget()
+        self.data.insert(i, item)
+        self._changed(i)
+
+MutableMapping.register(RabjDict)
+MutableSequence.register(RabjList)
+_slot_names = frozenset(RabjContainer.__slots__ + RabjDict.__slots__)
@@ -5,10 +5,10 @@ Functions that provide a convenient often used transformation of the
 results from a rabj API
 '''
 
-import simple
+import columnar, localstore, simple
 
 
-def export_judgments_as_tuples(server, queue, access_key, state, min=2):
+def export_judgments_as_tuples(server, queue, access_key, state, min=2, store=None):
   '''
   Exports the judgments from completed questions on a queue.
 
@@ -17,24 +17,29 @@ def export_judgments_as_tuples(server, queue, access_key, state, min=2):
 
   If a question has multiple judgments there will be multiple records
   for that questions
+
+  If store is given (a QuestionStore or the path of one) questions are
+  read from it and only questions new since the last export are fetched
   '''
   srv = simple.RabjServer(server)
   queue = srv.get_queue(queue_id=queue, access_key=access_key)
+  if isinstance(store, basestring):
+    store = localstore.QuestionStore(store)
 
-  for q in queue.iterall(state=state, judgments=True):
-    if len(q['judgments']) < min:
-      continue
+  questions = queue.iterall(state=state, judgments=True, store=store)
+  for judgment in columnar.judgment_tuples(questions, min):
+    yield judgment
 
-    qid = q['id']
-    for j in q['judgments']:
-      judge = j['user']['fb_user_id']
-      jval = j['value']
-      if jval == 'reconciled':
-        value = "%s:%s" % (j['value'], j['__metadata__']['recon_id'])
-      else:
-        value = jval
 
-      yield qid, judge, value
+def export_judgments_as_columns(server, queue, access_key, state, min=2, store=None):
+  '''
+  Exports the judgments from completed questions on a queue as a
+  rabj.columnar.JudgmentColumns, the qids, fb_user_ids and values coded as
+  integers in numpy arrays. Takes the same arguments as
+  export_judgments_as_tuples. Requires numpy.
+  '''
+  return columnar.JudgmentColumns.from_tuples(
+    export_judgments_as_tuples(server, queue, access_key, state, min, store))
 
 
 def rabj_prod():
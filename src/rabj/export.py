@@ -0,0 +1,195 @@
+'''
+export.py
+
+Export of the questions on a queue to newline delimited json (one question
+per line), fetching ranges of the queue in parallel and checkpointing
+progress so an interrupted export can be resumed.
+'''
+import logging, os, time
+import workers
+from util import json
+
+_log = logging.getLogger("pyrabj.export")
+
+class QueueExporter(object):
+    """
+    Exports the questions on a :class:`~rabj.simple.RabjQueue` as NDJSON.
+    The queue is split into chunks of chunksize questions using the counts
+    from the queue status and the chunks are fetched by a pool of threads.
+
+    >>> exporter = QueueExporter(queue, state='complete', threads=8,
+    ...                          checkpoint='/var/tmp/export.ckpt')
+    >>> stats = exporter.export('/var/tmp/export.json')
+
+    queue
+        The :class:`~rabj.simple.RabjQueue` to export
+
+    state
+        Export only questions in this state, default is 'complete'
+
+    body, judgments
+        Include question bodies and judgments, default is True for both
+
+    chunksize
+        The number of questions fetched per request, default is 5000
+
+    threads
+        The number of chunks fetched concurrently, default is 4
+
+    ordered
+        Write chunks in queue order (the default) or as soon as they arrive
+
+    checkpoint
+        A file recording the completed chunks. If it exists the export
+        resumes from it, skipping the chunks already written
+
+    start, num
+        Export num questions (default all) from index start (default 0)
+
+    progress
+        A callable invoked with the stats dict after every chunk
+    """
+    def __init__(self, queue, state='complete', body=True, judgments=True, chunksize=5000,
+                 threads=4, ordered=True, checkpoint=None, start=0, num=None, progress=None):
+        self.queue = queue
+        self.state = state
+        self.body = body
+        self.judgments = judgments
+        self.chunksize = chunksize
+        self.threads = threads
+        self.ordered = ordered
+        self.checkpoint = checkpoint
+        self.start = start
+        self.num = num
+        self.progress = progress
+        self.stats = None
+
+    def export(self, out):
+        """
+        Exports the queue to out, a file name or a file object. When resuming
+        into a file name the file is first truncated to the size recorded in
+        the checkpoint, dropping any partially written chunk. Returns the
+        stats of the export: questions and chunks written, seconds elapsed
+        and questions per second.
+        """
+        done = self._load_checkpoint()
+        if isinstance(out, basestring):
+            outfile = open(out, 'ab')
+            outfile.seek(0, os.SEEK_END)
+            if done['bytes'] < outfile.tell():
+                outfile.truncate(done['bytes'])
+            try:
+                return self._export(outfile, done)
+            finally:
+                outfile.close()
+        else:
+            return self._export(out, done)
+
+    def _export(self, out, done):
+        self.stats = { 'questions': done['questions'], 'chunks': len(done['chunks']),
+                       'seconds': 0.0, 'rate': 0.0 }
+        began = time.time()
+        exported = 0
+
+        written = dict(done['chunks'])
+        offsets = [ offset for offset in self._plan() if offset not in written ]
+        _log.info("Exporting %i chunks of %i questions with %i threads",
+                  len(offsets), self.chunksize, self.threads)
+
+        for offset, chunk, exc in workers.run(self._fetch, offsets, self.threads, self.ordered):
+            if exc is not None:
+                raise exc[0], exc[1], exc[2]
+            lines, count = chunk
+            exported += self._write(out, done, offset, lines, count, began, exported)
+            written[offset] = count
+
+        # the queue may have grown since it was planned, continue sequentially
+        while self.num is None and written:
+            offset = max(written)
+            if written[offset] < self.chunksize:
+                break
+            offset += self.chunksize
+            lines, count = self._fetch(offset)
+            exported += self._write(out, done, offset, lines, count, began, exported)
+            written[offset] = count
+
+        return self.stats
+
+    def _plan(self):
+        """The offsets of the chunks to export"""
+        total = self.queue._state_count(self.state)
+        if total is None:
+            total = self.start + self.chunksize
+        end = total if self.num is None else min(total, self.start + self.num)
+        return range(self.start, max(end, self.start + 1), self.chunksize)
+
+    def _chunk_limit(self, offset):
+        """The number of questions to fetch in the chunk at offset"""
+        if self.num is None:
+            return self.chunksize
+        return max(0, min(self.chunksize, self.start + self.num - offset))
+
+    def _fetch(self, offset):
+        """Fetches the chunk at offset and encodes it, returning the lines
+        and the number of questions"""
+        params = { 'limit': self._chunk_limit(offset), 'offset': offset }
+        if self.body:
+            params['body'] = self.body
+        if self.judgments:
+            params['judgments'] = self.judgments
+        if self.state:
+            getter = self.queue.queue.questions[self.state].get
+        else:
+            getter = self.queue.queue.questions.get
+
+        resp, result = getter(**params)
+        questions = result['questions']
+        lines = ''.join([ q.tojson() + '\n' for q in questions ])
+        return lines, len(questions)
+
+    def _write(self, out, done, offset, lines, count, began, exported):
+        out.write(lines)
+        out.flush()
+
+        done['chunks'].append([offset, count])
+        done['questions'] += count
+        done['bytes'] += len(lines)
+        self._save_checkpoint(done)
+
+        elapsed = time.time() - began
+        self.stats.update(questions=done['questions'], chunks=len(done['chunks']),
+                          seconds=elapsed, rate=(exported + count) / max(elapsed, 1e-6))
+        _log.info("Exported %i questions at offset %i, %0.1f questions/s",
+                  count, offset, self.stats['rate'])
+        if self.progress is not None:
+            self.progress(self.stats)
+        return count
+
+    def _load_checkpoint(self):
+        """The progress recorded in the checkpoint, or a fresh one"""
+        if self.checkpoint and os.path.exists(self.checkpoint):
+            ckpt = open(self.checkpoint)
+            try:
+                done = json.loads(ckpt.read())
+            finally:
+                ckpt.close()
+            if (done['queue'], done['state'], done['chunksize']) != (self.queue['id'], self.state,
+                                                                     self.chunksize):
+                raise ValueError("Checkpoint %s is for a different export" % self.checkpoint)
+            _log.info("Resuming export, %i chunks already done", len(done['chunks']))
+            return done
+
+        return { 'queue': self.queue['id'], 'state': self.state, 'chunksize': self.chunksize,
+                 'chunks': [], 'questions': 0, 'bytes': 0 }
+
+    def _save_checkpoint(self, done):
+        if not self.checkpoint:
+            return
+        # write then rename so a crash never leaves a truncated checkpoint
+        tmp = self.checkpoint + '.tmp'
+        ckpt = open(tmp, 'w')
+        try:
+            ckpt.write(json.dumps(done))
+        finally:
+            ckpt.close()
+        os.rename(tmp, self.checkpoint)
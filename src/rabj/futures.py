@@ -0,0 +1,291 @@
+'''
+futures.py
+
+Non-blocking counterparts of the rabj.api and rabj.simple classes. Every
+method which talks to the server returns a :class:`~rabj.workers.Future`
+immediately; the request itself runs on a shared
+:class:`~rabj.workers.Executor` whose size limits the number of requests in
+flight. Results can be waited for with ``future.result()`` or delivered to an
+event loop with ``future.add_done_callback``.
+'''
+import logging, sys, threading
+import api, simple, workers
+
+_log = logging.getLogger('pyrabj.futures')
+
+class AsyncRabjCallable(object):
+    """
+    Wraps a :class:`~rabj.api.RabjCallable` so that :meth:`get`,
+    :meth:`post`, :meth:`put` and :meth:`delete` return futures of the usual
+    ``(RabjResponse, RabjContainer)`` tuple. URL traversal works as for a
+    RabjCallable::
+
+        >>> executor = workers.Executor(threads=20)
+        >>> rabj = AsyncRabjCallable(api.RabjCallable('http://data.labs.freebase.com/rabj/'), executor)
+        >>> future = rabj.store.queues.public.get()
+        >>> resp, public_queues = future.result()
+    """
+    def __init__(self, rabjcallable, executor):
+        self._callable = rabjcallable
+        self._executor = executor
+
+    def __repr__(self):
+        return "<%s@%s>" % (self.__class__.__name__, self._callable._url)
+
+    def __getattr__(self, attr):
+        return self[attr]
+
+    def __getitem__(self, key):
+        return AsyncRabjCallable(self._callable[key], self._executor)
+
+    def get(self, **kwargs):
+        """Future of a HTTP GET, see :meth:`RabjCallable.get`"""
+        return self._executor.submit(self._callable.get, **kwargs)
+
+    def post(self, **kwargs):
+        """Future of a HTTP POST, see :meth:`RabjCallable.post`"""
+        return self._executor.submit(self._callable.post, **kwargs)
+
+    def put(self, **kwargs):
+        """Future of a HTTP PUT, see :meth:`RabjCallable.put`"""
+        return self._executor.submit(self._callable.put, **kwargs)
+
+    def delete(self, **kwargs):
+        """Future of a HTTP DELETE, see :meth:`RabjCallable.delete`"""
+        return self._executor.submit(self._callable.delete, **kwargs)
+
+class AsyncRabjServer(object):
+    """
+    Non-blocking version of :class:`~rabj.simple.RabjServer`. All the queues
+    fetched through a server share its executor, so ``threads`` bounds the
+    number of concurrent requests made on behalf of the server.
+
+    server_url
+        A url for the rabj server
+
+    threads
+        The maximum number of requests in flight, default is 10
+    """
+    def __init__(self, server_url, threads=10, executor=None):
+        self.server = simple.RabjServer(server_url)
+        self.executor = executor if executor is not None else workers.Executor(threads)
+        self.store = AsyncRabjCallable(self.server.store, self.executor)
+
+    def get_queue(self, queue_id, access_key=None):
+        """Future of an :class:`AsyncRabjQueue` given the queue id"""
+        return self._submit(self._wrap, self.server.get_queue, queue_id, access_key)
+
+    def create_queue(self, name, owner, votes, access_key, tags=None, **meta):
+        """Future of a newly created :class:`AsyncRabjQueue`, see
+        :meth:`RabjServer.create_queue`"""
+        return self._submit(self._wrap, self.server.create_queue, name, owner, votes,
+                            access_key, tags, **meta)
+
+    def delete_queue(self, queue, access_key=None):
+        """Future of the deletion result, see :meth:`RabjServer.delete_queue`"""
+        if isinstance(queue, AsyncRabjQueue):
+            queue = queue.queue
+        return self.executor.submit(self.server.delete_queue, queue, access_key)
+
+    def queues_by_tags(self, tags, access_key=None):
+        """Future of a list of :class:`AsyncRabjQueue` having the tags"""
+        return self._submit(self._wrap_all, self.server.queues_by_tags, tags, access_key)
+
+    def queues_by_owner(self, owner, access_key=None):
+        """Future of a list of :class:`AsyncRabjQueue` owned by owner"""
+        return self._submit(self._wrap_all, self.server.queues_by_owner, owner, access_key)
+
+    def public_queues(self):
+        """Future of a list of public :class:`AsyncRabjQueue`"""
+        return self._submit(self._wrap_all, self.server.public_queues)
+
+    def shutdown(self, wait=True):
+        """Stops the executor once pending requests have completed"""
+        self.executor.shutdown(wait)
+
+    def _submit(self, wrap, func, *args, **kwargs):
+        return self.executor.submit(lambda: wrap(func(*args, **kwargs)))
+
+    def _wrap(self, queue):
+        return AsyncRabjQueue(queue, self.executor)
+
+    def _wrap_all(self, queues):
+        return [ self._wrap(queue) for queue in queues ]
+
+class AsyncRabjQueue(object):
+    """
+    Non-blocking version of :class:`~rabj.simple.RabjQueue`. Reading and
+    setting fields is done on the wrapped queue and does not block.
+
+    queue
+        The :class:`~rabj.simple.RabjQueue` to wrap
+
+    executor
+        The :class:`~rabj.workers.Executor` running the requests
+    """
+    def __init__(self, queue, executor):
+        self.queue = queue
+        self.executor = executor
+
+    def __repr__(self):
+        return repr(self.queue)
+
+    def __getitem__(self, key):
+        return self.queue[key]
+
+    def __setitem__(self, key, value):
+        self.queue[key] = value
+
+    def status(self, **kwargs):
+        """Future of the queue status, see :meth:`RabjQueue.status`"""
+        return self.executor.submit(self.queue.status, **kwargs)
+
+    def update(self):
+        """Future of the saved queue"""
+        def update():
+            self.queue.update()
+            return self
+        return self.executor.submit(update)
+
+    def get_one(self, question=None):
+        """Future of a :class:`~rabj.simple.RabjQuestion`, see
+        :meth:`RabjQueue.get_one`"""
+        return self.executor.submit(self.queue.get_one, question)
+
+    def add_one(self, assertion, answerspace, **meta):
+        """Future of the added question, see :meth:`RabjQueue.add_one`"""
+        return self.executor.submit(self.queue.add_one, assertion, answerspace, **meta)
+
+    def add_all(self, three_tuples, pagesize=1000):
+        """
+        Future of the list of added questions. Each page of questions is
+        posted as a separate request as soon as it has been read from
+        three_tuples, so pages are sent concurrently, up to the limit of the
+        executor, while the rest are read. See :meth:`RabjQueue.add_all` for
+        the parameters.
+        """
+        posts = []
+        page = []
+        for three_tuple in three_tuples:
+            page.append(three_tuple)
+            if len(page) == pagesize:
+                posts.append(self.executor.submit(self.queue.add_all, page, pagesize))
+                page = []
+        if page:
+            posts.append(self.executor.submit(self.queue.add_all, page, pagesize))
+        return _gather(posts)
+
+    def remove(self, questions, delete=False):
+        """Future of the removal result, see :meth:`RabjQueue.remove`"""
+        return self.executor.submit(self.queue.remove, list(questions), delete)
+
+    def get_all(self, state=None, body=True, judgments=False, since=None, pagesize=5000):
+        """Future of the list of all questions, pages are fetched
+        concurrently. See :meth:`RabjQueue.iter_all` for the parameters."""
+        pages = self.get_pages(state, body, judgments, since, pagesize)
+        return _chain(pages, _gather)
+
+    def get_pages(self, state=None, body=True, judgments=False, since=None, pagesize=5000):
+        """
+        Future of the list of futures of the pages of questions on the
+        queue, in order. Each page future resolves to a list of
+        :class:`~rabj.simple.RabjQuestion`, so pages can be processed as
+        soon as they arrive. The page offsets are planned from the queue
+        status and all the pages are requested at once; questions added to
+        the queue during the scan may be missed. See
+        :meth:`RabjQueue.iter_all` for the parameters.
+        """
+        def plan(total):
+            if total is None:
+                # there's no count to plan the pages with, fetch sequentially
+                return [ self.executor.submit(self.queue.get_all, state, body, judgments,
+                                              since, pagesize, 1) ]
+            return [ self.executor.submit(fetch, offset)
+                     for offset in range(0, total, pagesize) ]
+
+        params = { 'limit': pagesize }
+        if judgments:
+            params['judgments'] = judgments
+        if body:
+            params['body'] = body
+        if state:
+            getter = self.queue.queue.questions[state].get
+        else:
+            getter = self.queue.queue.questions.get
+
+        def fetch(offset):
+            resp, result = getter(offset=offset, **params)
+            return [ simple.RabjQuestion(res) for res in result['questions'] ]
+
+        if since:
+            count = workers.Future()
+            count.set_result(None)
+        else:
+            count = self.executor.submit(self.queue._state_count, state)
+
+        def planned(total):
+            future = workers.Future()
+            future.set_result(plan(total))
+            return future
+        return _chain(count, planned)
+
+def _chain(future, fn):
+    """
+    Future of the result of the future returned by fn(future.result()). No
+    worker thread is blocked while waiting.
+    """
+    chained = workers.Future()
+    def on_result(done):
+        exc = done.exception()
+        if exc is not None:
+            chained.set_exception(exc)
+            return
+        try:
+            following = fn(done.result())
+        except Exception:
+            chained.set_exception(sys.exc_info())
+            return
+        following.add_done_callback(lambda f: _forward(f, chained))
+    future.add_done_callback(on_result)
+    return chained
+
+def _forward(source, target):
+    """Completes target with the outcome of the completed source future"""
+    exc = source.exception()
+    if exc is not None:
+        target.set_exception(exc)
+    else:
+        target.set_result(source.result())
+
+def _gather(futures):
+    """Future of the concatenated results of a list of futures, fails with
+    the first failure"""
+    gathered = workers.Future()
+    remaining = [len(futures)]
+    lock = threading.Lock()
+
+    def on_done(done):
+        lock.acquire()
+        try:
+            if gathered.done():
+                return
+            exc = done.exception()
+            if exc is not None:
+                gathered.set_exception(exc)
+                return
+            remaining[0] -= 1
+            if remaining[0]:
+                return
+        finally:
+            lock.release()
+
+        results = []
+        for future in futures:
+            results.extend(future.result())
+        gathered.set_result(results)
+
+    if not futures:
+        gathered.set_result([])
+    for future in futures:
+        future.add_done_callback(on_done)
+    return gathered
@@ -0,0 +1,184 @@
+'''
+localstore.py
+
+A persistent local copy of questions fetched from rabj, so questions which
+don't change (Eg: completed questions and their judgments) are downloaded
+once and read from disk afterwards.
+'''
+import logging, threading, time
+import containers, simple
+from util import json
+
+try:
+    import sqlite3
+except ImportError:
+    """Jython 2.5 doesn't ship sqlite3, the store is unavailable there."""
+    sqlite3 = None
+
+_log = logging.getLogger("pyrabj.localstore")
+
+class QuestionStore(object):
+    """
+    A sqlite database of questions keyed by question id. Each scan of a
+    queue (a queue, a state and whether judgments are included) remembers
+    the questions it returned, in order, and the
+    :class:`~rabj.simple.RabjCursor` where it stopped. Syncing a scan only
+    fetches questions newer than the cursor, see
+    :meth:`RabjQueue.iter_cursor <rabj.simple.RabjQueue.iter_cursor>`.
+
+    >>> store = QuestionStore('/var/tmp/rabj-questions.db')
+    >>> for q in queue.iter_all(state='complete', judgments=True, store=store):
+    ...     print q['id'], len(q['judgments'])
+
+    path
+        The database file, created if it doesn't exist. ':memory:' keeps the
+        store in memory
+    """
+    def __init__(self, path):
+        if sqlite3 is None:
+            raise ImportError("QuestionStore requires the sqlite3 module")
+
+        self.path = path
+        self._lock = threading.RLock()
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        self._db.executescript("""
+            CREATE TABLE IF NOT EXISTS questions (
+                id TEXT PRIMARY KEY,
+                body TEXT NOT NULL
+            );
+            CREATE TABLE IF NOT EXISTS scan_questions (
+                scan TEXT NOT NULL,
+                seq INTEGER NOT NULL,
+                id TEXT NOT NULL,
+                PRIMARY KEY (scan, id)
+            );
+            CREATE INDEX IF NOT EXISTS scan_questions_seq ON scan_questions (scan, seq);
+            CREATE TABLE IF NOT EXISTS scans (
+                scan TEXT PRIMARY KEY,
+                cursor TEXT NOT NULL,
+                synced REAL NOT NULL
+            );
+        """)
+
+    def __repr__(self):
+        return "<%s@%s>" % (self.__class__.__name__, self.path)
+
+    def __len__(self):
+        return self._query("SELECT COUNT(*) FROM questions").fetchone()[0]
+
+    def close(self):
+        self._db.close()
+
+    def get(self, question_id):
+        """The stored question body (a dict) for question_id, None if it
+        isn't stored"""
+        row = self._query("SELECT body FROM questions WHERE id = ?", (question_id, )).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def put(self, questions, scan=None):
+        """Stores questions, adding them to scan if one is given"""
+        self._lock.acquire()
+        try:
+            db = self._db
+            seq = 0
+            if scan is not None:
+                seq = db.execute("SELECT COALESCE(MAX(seq), 0) FROM scan_questions WHERE scan = ?",
+                                 (scan, )).fetchone()[0]
+            for question in questions:
+                data = getattr(question, 'data', question)
+                db.execute("INSERT OR REPLACE INTO questions (id, body) VALUES (?, ?)",
+                           (data['id'], json.dumps(data)))
+                if scan is not None:
+                    seq += 1
+                    db.execute("INSERT OR IGNORE INTO scan_questions (scan, seq, id) VALUES (?, ?, ?)",
+                               (scan, seq, data['id']))
+                self._index(db, data, scan)
+            db.commit()
+        finally:
+            self._lock.release()
+
+    def cursor(self, scan):
+        """The cursor where the last sync of scan stopped, None if it was
+        never synced"""
+        row = self._query("SELECT cursor FROM scans WHERE scan = ?", (scan, )).fetchone()
+        return simple.RabjCursor.loads(row[0]) if row else None
+
+    def last_synced(self, scan):
+        """The time of the last sync of scan, None if it was never synced"""
+        row = self._query("SELECT synced FROM scans WHERE scan = ?", (scan, )).fetchone()
+        return row[0] if row else None
+
+    def sync(self, queue, state=None, judgments=False, pagesize=5000):
+        """
+        Fetches the questions of queue added to the scan since it was last
+        synced and stores them. Returns the number of questions fetched.
+        """
+        scan = self.scan_key(queue, state, judgments)
+        cursor = self.cursor(scan) or simple.RabjCursor()
+        fetched = 0
+        page = []
+        for question in queue.iter_cursor(cursor, state=state, judgments=judgments,
+                                          pagesize=pagesize):
+            page.append(question)
+            if len(page) == pagesize:
+                fetched += self._save(scan, page, cursor)
+                page = []
+        fetched += self._save(scan, page, cursor)
+
+        _log.info("Synced %i questions for %s", fetched, scan)
+        return fetched
+
+    def iter_all(self, queue, state=None, judgments=False, pagesize=5000, sync=True):
+        """
+        Syncs the scan of queue (unless sync is False) and iterates over its
+        questions from the store as :class:`~rabj.simple.RabjQuestion`
+        objects, in the order they were first fetched.
+        """
+        if sync:
+            self.sync(queue, state, judgments, pagesize)
+
+        scan = self.scan_key(queue, state, judgments)
+        return self._questions(queue.queue.url,
+                               "SELECT q.body FROM scan_questions s JOIN questions q ON s.id = q.id "
+                               "WHERE s.scan = ? ORDER BY s.seq", (scan, ), pagesize)
+
+    def scan_key(self, queue, state, judgments):
+        """The key identifying a scan of queue"""
+        return "%s|%s|%i" % (queue['id'], state or '', bool(judgments))
+
+    def _index(self, db, data, scan):
+        """Called for every question stored, within the same transaction.
+        Subclasses maintain their own indexes here"""
+        pass
+
+    def _save(self, scan, page, cursor):
+        """Stores a page of a scan along with the cursor after it"""
+        self.put(page, scan)
+        self._lock.acquire()
+        try:
+            self._db.execute("INSERT OR REPLACE INTO scans (scan, cursor, synced) VALUES (?, ?, ?)",
+                             (scan, cursor.dumps(), time.time()))
+            self._db.commit()
+        finally:
+            self._lock.release()
+        return len(page)
+
+    def _questions(self, url, sql, params, pagesize=1000):
+        """Iterates over the question bodies selected by sql as
+        RabjQuestions of the server at url"""
+        factory = containers.RabjContainerFactory.for_url(url)
+        rows = self._query(sql, params)
+        while True:
+            batch = rows.fetchmany(pagesize)
+            if not batch:
+                break
+            for (body, ) in batch:
+                yield simple.RabjQuestion(factory.container(json.loads(body), url))
+
+    def _query(self, sql, params=()):
+        """Runs a read query, returning a cursor over its rows"""
+        self._lock.acquire()
+        try:
+            return self._db.execute(sql, params)
+        finally:
+            self._lock.release()
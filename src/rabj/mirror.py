@@ -0,0 +1,150 @@
+'''
+mirror.py
+
+A local replica of a rabj queue which is kept up to date incrementally and
+can be queried without going back to the server.
+'''
+import logging, time
+import localstore
+from util import json
+
+_log = logging.getLogger("pyrabj.mirror")
+
+class QueueMirror(localstore.QuestionStore):
+    """
+    A local copy of the questions, states and judgments of a
+    :class:`~rabj.simple.RabjQueue`. The first :meth:`sync_all` loads the whole
+    queue, later syncs fetch only the questions changed since the previous
+    one using the ``since`` filter. Questions are indexed by state, tag,
+    judging user and answer value for :meth:`query`.
+
+    >>> mirror = QueueMirror(queue, '/var/tmp/myqueue.db')
+    >>> mirror.sync_all()
+    >>> for q in mirror.query(state='complete', user='/user/kochhar'):
+    ...     print q['id']
+    >>> recent = mirror.changed(seconds=3600)
+
+    queue
+        The :class:`~rabj.simple.RabjQueue` to mirror
+
+    path
+        The database file, default is ':memory:'
+
+    states
+        The states of questions to mirror, each is scanned separately so the
+        state of every question is known. A question returned by a later
+        scan takes that scan's state
+    """
+    def __init__(self, queue, path=':memory:', states=('wanting', 'complete')):
+        super(QueueMirror, self).__init__(path)
+        self.queue = queue
+        self.states = states
+        self._scan_states = dict((self.scan_key(queue, state, True), state) for state in states)
+        self._db.executescript("""
+            CREATE TABLE IF NOT EXISTS mirror_states (
+                id TEXT PRIMARY KEY,
+                state TEXT,
+                changed REAL NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS mirror_states_state ON mirror_states (state);
+            CREATE INDEX IF NOT EXISTS mirror_states_changed ON mirror_states (changed);
+            CREATE TABLE IF NOT EXISTS mirror_tags (
+                id TEXT NOT NULL,
+                tag TEXT NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS mirror_tags_tag ON mirror_tags (tag);
+            CREATE INDEX IF NOT EXISTS mirror_tags_id ON mirror_tags (id);
+            CREATE TABLE IF NOT EXISTS mirror_judgments (
+                id TEXT NOT NULL,
+                user TEXT,
+                value TEXT
+            );
+            CREATE INDEX IF NOT EXISTS mirror_judgments_user ON mirror_judgments (user);
+            CREATE INDEX IF NOT EXISTS mirror_judgments_value ON mirror_judgments (value);
+            CREATE INDEX IF NOT EXISTS mirror_judgments_id ON mirror_judgments (id);
+        """)
+
+    def sync_all(self, pagesize=5000):
+        """
+        Fetches the questions changed since the last sync, in each of the
+        mirrored states. Returns the number of questions fetched.
+        """
+        fetched = 0
+        for state in self.states:
+            fetched += self.sync(self.queue, state, True, pagesize)
+        return fetched
+
+    def query(self, state=None, tag=None, user=None, value=None):
+        """
+        Iterates over the mirrored questions matching all the given
+        criteria as :class:`~rabj.simple.RabjQuestion` objects
+
+        state
+            The state of the question, Eg: 'complete'
+
+        tag
+            A tag on the question
+
+        user
+            The fb_user_id of a user who judged the question
+
+        value
+            An answer given in a judgment of the question
+        """
+        sql = ["SELECT q.body FROM questions q JOIN mirror_states s ON s.id = q.id"]
+        where, params = [], []
+        if state is not None:
+            where.append("s.state = ?")
+            params.append(state)
+        if tag is not None:
+            where.append("q.id IN (SELECT id FROM mirror_tags WHERE tag = ?)")
+            params.append(tag)
+        if user is not None or value is not None:
+            judged = ["SELECT id FROM mirror_judgments WHERE 1"]
+            if user is not None:
+                judged.append("user = ?")
+                params.append(user)
+            if value is not None:
+                judged.append("value = ?")
+                params.append(self._value_key(value))
+            where.append("q.id IN (%s)" % " AND ".join(judged))
+        if where:
+            sql.append("WHERE " + " AND ".join(where))
+        sql.append("ORDER BY s.changed, q.id")
+        return self._questions(self.queue.queue.url, " ".join(sql), params)
+
+    def changed(self, seconds=None, since=None):
+        """
+        Iterates over the questions which changed locally (were fetched by a
+        sync) in the last seconds, or after the unix time since
+        """
+        if since is None:
+            since = time.time() - seconds
+        return self._questions(self.queue.queue.url,
+                               "SELECT q.body FROM questions q JOIN mirror_states s ON s.id = q.id "
+                               "WHERE s.changed >= ? ORDER BY s.changed, q.id", (since, ))
+
+    def counts(self):
+        """A dict of the number of mirrored questions in each state"""
+        rows = self._query("SELECT state, COUNT(*) FROM mirror_states GROUP BY state")
+        return dict(rows.fetchall())
+
+    def _index(self, db, data, scan):
+        qid = data['id']
+        state = self._scan_states.get(scan, data.get('state'))
+        db.execute("INSERT OR REPLACE INTO mirror_states (id, state, changed) VALUES (?, ?, ?)",
+                   (qid, state, time.time()))
+        db.execute("DELETE FROM mirror_tags WHERE id = ?", (qid, ))
+        db.executemany("INSERT INTO mirror_tags (id, tag) VALUES (?, ?)",
+                       [ (qid, tag) for tag in data.get('tags') or () ])
+        db.execute("DELETE FROM mirror_judgments WHERE id = ?", (qid, ))
+        db.executemany("INSERT INTO mirror_judgments (id, user, value) VALUES (?, ?, ?)",
+                       [ (qid, (j.get('user') or {}).get('fb_user_id'), self._value_key(j.get('value')))
+                         for j in data.get('judgments') or () ])
+
+    def _value_key(self, value):
+        """Answer values may be any json, strings are indexed as they are and
+        other values by their json encoding"""
+        if isinstance(value, basestring):
+            return value
+        return json.dumps(value)
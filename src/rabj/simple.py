@@ -1,6 +1,6 @@
-import logging
+import logging, sys, time
 from rabj import VERSION, APP
-import api, containers, util as u
+import api, containers, tuning, workers, util as u
 api._def_headers['User-agent'] = ':'.join([APP, 'pyrabj.simple', VERSION])
 
 """
@@ -18,8 +18,24 @@ class RabjServer(object):
 
     server_url
         A url for the rabj server hosting the queue.
+
+    cache
+        An optional :class:`~rabj.cache.ResponseCache` answering repeated
+        GETs to the server, Eg: queue status polls. It is shared by every
+        object talking to the same host.
+
+    question_cache
+        An optional :class:`~rabj.cache.QuestionCache` of questions by id,
+        shared in the same way. Questions fetched by id are looked up in it
+        first
+
+    The ``threads`` attribute sets how many requests
+    :meth:`get_questions` keeps in flight when no explicit value is passed,
+    default is 1, as for :class:`RabjQueue`.
     """
-    def __init__(self, server_url, store_path='rabj/store/'):
+    threads = 1
+
+    def __init__(self, server_url, store_path='rabj/store/', cache=None, question_cache=None):
         """Create a new reference to a rabj server."""
         if server_url.endswith('/rabj/store/'):
             self.server = server_url[:-11]
@@ -27,8 +43,13 @@ class RabjServer(object):
             self.server = server_url[:-5]
         else:
             self.server = server_url
-        
-        self.store = api.RabjCallable(self.server)[store_path]
+
+        self.transport = api.transport_for(self.server)
+        if cache is not None:
+            self.transport.cache = cache
+        if question_cache is not None:
+            self.transport.question_cache = question_cache
+        self.store = api.RabjCallable(self.server, transport=self.transport)[store_path]
         
     def create_queue(self, name, owner, votes, access_key, tags=None, **meta):
         """
@@ -144,6 +165,16 @@ class RabjServer(object):
 
     queues_by_public = public_queues
     
+    def get_questions(self, questions, access_key=None, threads=None, ordered=True):
+        """
+        Fetches many questions by id from the server, see
+        :meth:`RabjQueue.get_many`
+        """
+        if threads is None:
+            threads = self.threads
+        root = api.RabjCallable(self.server, access_key=access_key, transport=self.transport)
+        return _get_questions(self.server, root.for_path, questions, threads, ordered)
+
     def _norm_qid(self, qid):
         if qid.startswith('/rabj/store'):
             return qid[11:]
@@ -174,7 +205,21 @@ class RabjQueue(object):
 
     access_key
         The access key for the queue on the server. Required if ``queue=None``
+
+    The ``threads`` attribute sets how many requests :meth:`iter_all` and
+    the other bulk methods taking a threads argument keep in flight when no
+    explicit value is passed, default is 1.
+
+    Passing ``pagesize='auto'`` to :meth:`iter_all` or :meth:`add_all` tunes
+    the page size from the measured latency, response size and errors. The
+    :class:`~rabj.tuning.PageSizer` used is kept in the ``read_sizer`` and
+    ``write_sizer`` attributes respectively so the chosen sizes can be
+    monitored.
     """
+    threads = 1
+    read_sizer = None
+    write_sizer = None
+
     def __init__(self, queue=None, server_url=None, id=None, access_key=None):
         """
         Create a new rabj queue. Not intended to be used directly, see the
@@ -204,9 +249,20 @@ class RabjQueue(object):
     def __delitem__(self, key):
         del self.queue[key]
     
-    def update(self):
-        """Save modifications to the current queue. Returns the updated result"""
-        resp, result = self.queue.put(queue=self.queue)
+    def update(self, full=False):
+        """
+        Save modifications to the current queue. Only the fields changed
+        since the queue was fetched are sent, nothing is sent if none were
+        changed. full sends the whole queue. Returns the updated queue.
+        """
+        if full:
+            payload = self.queue
+        elif self.queue.dirty:
+            payload = self.queue.changes()
+        else:
+            return self
+
+        resp, result = self.queue.put(queue=payload)
         self.queue = result
         return self
     
@@ -221,7 +277,7 @@ class RabjQueue(object):
         resp, result = self.queue.questions.post(questions=[question])
         return result['questions']
     
-    def add_all(self, three_tuples, pagesize=1000):
+    def add_all(self, three_tuples, pagesize=1000, threads=None):
         """
         Add questions passed as three-tuples (assertion, answerspace,
         metadata dict), optionally provide a batchsize, default of 1000
@@ -232,27 +288,86 @@ class RabjQueue(object):
             dictionary containing other metadata.
 
         pagesize:
-            The number of questions to send in one request, default is 1000
+            The number of questions to send in one request, default is 1000.
+            Either 'auto' or a :class:`~rabj.tuning.PageSizer` adapts the
+            number to the measured latency and errors
+
+        threads:
+            The number of requests to keep in flight while further batches
+            are built from three_tuples, defaults to the ``threads``
+            attribute of the queue.
+
+        The added questions are returned in input order. If any batch
+        fails the remaining batches are still sent and a
+        :class:`~rabj.api.RabjBatchError` is raised once all are done,
+        holding the questions added by the successful batches.
         """
+        if threads is None:
+            threads = self.threads
+        sizer = self._pagesizer(pagesize, 'write_sizer')
+
+        def post(payload):
+            if sizer is not None:
+                return self._post_sized(payload, sizer)
+            resp, result = self.queue.questions.post(questions=payload)
+            return result['questions']
+
         added = []
+        failures = []
+        batches = 0
+        for payload, result, exc in workers.run(post, self._batches(three_tuples, pagesize, sizer),
+                                                threads):
+            batches += 1
+            if exc is not None:
+                _log.warn("Failed to add %i questions: %s", len(payload), exc[1])
+                failures.append((payload, exc))
+            else:
+                added.extend(result)
+
+        if failures:
+            raise api.RabjBatchError(added, failures, batches)
+        return added
+
+    def _batches(self, three_tuples, pagesize, sizer=None):
+        """Builds the payloads of pagesize questions to post from
+        three_tuples. With a sizer the size of each payload is its current
+        size"""
         payload = []
         for assertion, answerspace, meta in three_tuples:
             question = { 'assertion': assertion,
                          'answerspace': answerspace }
             question.update(meta)
             payload.append(question)
-            if len(payload) == pagesize:
-                resp, result = self.queue.questions.post(questions=payload)
-                added.extend(result['questions'])
+            if len(payload) >= (sizer.size if sizer is not None else pagesize):
+                yield payload
                 payload = []
 
         if len(payload):
-            resp, result = self.queue.questions.post(questions=payload)
+            yield payload
+
+    def _post_sized(self, payload, sizer):
+        """Posts payload in as many requests as the sizer requires"""
+        added = []
+        while payload:
+            size, (resp, result) = sizer.call(
+                lambda size: self.queue.questions.post(questions=payload[:size]),
+                limit=len(payload))
             added.extend(result['questions'])
-            payload = []
-        
+            payload = payload[size:]
         return added
-    
+
+    def _pagesizer(self, pagesize, attr):
+        """The PageSizer to use for pagesize, None if the size is fixed. For
+        'auto' the sizer kept in attr is used, creating it if necessary"""
+        if isinstance(pagesize, tuning.PageSizer):
+            return pagesize
+        elif pagesize == 'auto':
+            if getattr(self, attr) is None:
+                setattr(self, attr, tuning.PageSizer())
+            return getattr(self, attr)
+        else:
+            return None
+
     def get_one(self, question=None):
         """
         Get one question from the queue. Optionally the id of the question to
@@ -265,14 +380,71 @@ class RabjQueue(object):
             else:
                 questionid = question
 
-            resp, question = self.queue['../../../../'][questionid].get()
+            question = _cached_question(self.queue.url, questionid)
+            if question is None:
+                resp, question = self._question(questionid).get()
+                _cache_question(question)
         else:
             resp, result = self.queue.questions.get(limit=1)
             resp, question = result['questions'][0].http_get()
 
         return RabjQuestion(question)
 
-    def iter_all(self, state=None, body=True, judgments=False, since=None, pagesize=5000):
+    def judgments_for(self, questions, threads=None, ordered=False):
+        """
+        Fetches the judgments of many questions, keeping up to threads
+        (default the ``threads`` attribute of the queue) requests in flight
+        over the pooled connections to the server.
+        Yields ``(question id, judgments, exc_info)`` for each question as
+        its request finishes (in input order if ordered is True). exc_info
+        is None unless fetching that question failed, in which case
+        judgments is None.
+
+        questions
+            An iterable of question ids or questions, consumed as requests
+            are issued
+
+        >>> for qid, judgments, exc in queue.judgments_for(flagged_ids, threads=20):
+        ...     if exc is None:
+        ...         audit(qid, judgments)
+        """
+        if threads is None:
+            threads = self.threads
+
+        def fetch(qid):
+            resp, result = self._question(qid)['judgments'].get()
+            return result['judgments']
+
+        for qid, judgments, exc in workers.run(fetch, _question_ids(questions), threads,
+                                               ordered):
+            if exc is not None:
+                _log.warn("Failed to fetch judgments for %s: %s", qid, exc[1])
+            yield qid, judgments, exc
+
+    def get_many(self, questions, threads=None, ordered=True):
+        """
+        Fetches many questions by id, keeping up to threads (default the
+        ``threads`` attribute of the queue) requests in flight. Repeated ids are fetched once. Yields ``(question id,
+        question, exc_info)`` for each distinct id, in input order unless
+        ordered is False, in which case questions are yielded as they
+        arrive. exc_info is None unless fetching that question failed.
+
+        questions
+            An iterable of question ids or questions
+
+        >>> questions = dict((qid, q) for qid, q, exc in queue.get_many(flagged_ids)
+        ...                  if exc is None)
+        """
+        if threads is None:
+            threads = self.threads
+        return _get_questions(self.queue.url, self._question, questions, threads, ordered)
+
+    def _question(self, questionid):
+        """The RabjCallable for the question questionid"""
+        return self.queue.for_path(questionid)
+
+    def iter_all(self, state=None, body=True, judgments=False, since=None, pagesize=5000,
+                 threads=None, prefetch=0, stream=False, store=None):
         """
         Iterate over all the questions on the queue
 
@@ -292,10 +464,45 @@ class RabjQueue(object):
             questions. Format is YYYY-MM-DD HH:MM:SS
 
         pagesize
-            The number of questions to fetch per request, default is 5000
+            The number of questions to fetch per request, default is 5000.
+            Either 'auto' or a :class:`~rabj.tuning.PageSizer` adapts the
+            number to the measured latency, response size and errors. The
+            size is only adapted when pages are fetched sequentially
+
+        threads
+            The number of pages to fetch concurrently, defaults to the
+            ``threads`` attribute of the queue. Questions are still yielded in
+            order
+
+        prefetch
+            The number of pages to fetch in the background while the current
+            page is being consumed, default is 0 (no read-ahead). At most
+            this many pages are held in memory in addition to the current
+            one
+
+        stream
+            Decode each page incrementally as it is read from the socket and
+            yield every question as soon as it has arrived, so only one
+            question is held in memory at a time. Pages are fetched
+            sequentially with a fixed size, threads and prefetch are
+            ignored. Default is False
+
+        store
+            A :class:`~rabj.localstore.QuestionStore` holding questions from
+            earlier scans. Only questions newer than the last sync are
+            fetched, the rest are read from the store. Meant for questions
+            which no longer change, Eg: ``state='complete'``. Full bodies
+            are always returned and since, threads, prefetch and stream are
+            ignored
         """
+        if store is not None:
+            for question in store.iter_all(self, state, judgments, pagesize):
+                yield question
+            return
+
+        sizer = self._pagesizer(pagesize, 'read_sizer')
         params = {
-            'limit': pagesize,
+            'limit': pagesize if sizer is None else sizer.size,
             'offset': 0
         }
         if since:
@@ -306,30 +513,331 @@ class RabjQueue(object):
             params['body'] = body
 
         if state:
-            getter = self.queue.questions[state].get
+            questions = self.queue.questions[state]
         else:
-            getter = self.queue.questions.get
-        while True:
-            resp, result = getter(**params)
-            for res in result['questions']:
+            questions = self.queue.questions
+
+        if stream:
+            for res in self._iter_streamed(questions.stream, params):
+                yield RabjQuestion(res)
+            return
+
+        getter = questions.get
+        if threads is None:
+            threads = self.threads
+
+        pages = self._iter_pages(getter, params, state, threads, sizer)
+        if prefetch:
+            pages = workers.prefetch(pages, prefetch)
+
+        for page in pages:
+            for res in page:
                 yield RabjQuestion(res)
 
+    def _iter_pages(self, getter, params, state, threads, sizer=None):
+        """
+        Yields pages of questions from getter. With more than one thread the
+        queue status is used to plan the page offsets up front, the planned
+        pages are fetched concurrently and the remainder (if the queue grew in
+        the meantime) sequentially. Sequential pages are sized by sizer if
+        one is given.
+        """
+        pagesize = params['limit']
+        def fetch(offset):
+            resp, result = getter(**dict(params, offset=offset))
+            return result['questions']
+
+        total = None
+        if threads > 1 and 'since' not in params:
+            total = self._state_count(state)
+
+        if total:
+            offsets = range(0, total, pagesize)
+            _log.debug("Fetching %i pages with %i threads", len(offsets), threads)
+            for page in workers.imap(fetch, offsets, threads):
+                yield page
+
+            # a short final page means there is nothing left to fetch
+            if len(page) < pagesize:
+                return
+            params['offset'] = offsets[-1] + len(page)
+
+        while True:
+            if sizer is not None:
+                pagesize, (resp, result) = sizer.call(
+                    lambda size: getter(**dict(params, limit=size)))
+                page = result['questions']
+            else:
+                page = fetch(params['offset'])
+            yield page
+
             # keep fetching until fewer than requested questions are returned
-            if len(result['questions']) < pagesize:
+            if len(page) < pagesize:
+                break
+            else:
+                params['offset'] += len(page)
+
+    def _iter_streamed(self, streamer, params):
+        """
+        Yields the questions from the pages streamed by streamer one at a
+        time.
+        """
+        while True:
+            count = 0
+            for res in streamer(**params):
+                count += 1
+                yield res
+
+            if count < params['limit']:
+                break
+            params['offset'] += count
+
+    def _state_count(self, state):
+        """
+        The number of questions on the queue in the given state according to
+        the queue status, None when the state has no count.
+        """
+        status_key = {None: "questions", "complete": "complete",
+                      "wanting": "incomplete"}.get(state)
+        if status_key is None:
+            return None
+        return self.status()[status_key]
+
+    def iter_cursor(self, cursor=None, state=None, body=True, judgments=False, pagesize=5000):
+        """
+        Iterate over the questions on the queue using keyset pagination. Each
+        request asks for the questions since the last timestamp seen rather
+        than for a growing offset, so every page costs the same and
+        questions added or removed during the scan don't shift the pages.
+
+        cursor
+            A :class:`RabjCursor` to resume from, defaults to a new cursor
+            starting at the beginning of the queue. The cursor is advanced
+            as questions are yielded and may be saved with
+            :meth:`RabjCursor.dumps` to resume an interrupted scan
+
+        See iter_all for an explanation of the other parameters
+        """
+        if cursor is None:
+            cursor = RabjCursor()
+
+        params = { 'limit': pagesize }
+        if judgments:
+            params['judgments'] = judgments
+        if body:
+            params['body'] = body
+
+        if state:
+            getter = self.queue.questions[state].get
+        else:
+            getter = self.queue.questions.get
+
+        offset = 0
+        while True:
+            since = cursor.since
+            if since is not None:
+                params['since'] = since
+            resp, result = getter(offset=offset, **params)
+            page = result['questions']
+            for res in page:
+                if cursor.advance(res):
+                    yield RabjQuestion(res)
+
+            if len(page) < pagesize:
                 break
+            elif cursor.since == since:
+                # the whole page shares one timestamp, step over it
+                offset += len(page)
             else:
-                params['offset'] += len(result['questions'])
+                offset = 0
+
+    def watch(self, state='complete', cursor=None, since=None, body=True, judgments=False,
+              pagesize=5000, min_interval=1.0, max_interval=300.0, checkpoint=None):
+        """
+        Iterate over questions as they reach state, forever. Each poll asks
+        for the questions since the cursor (see :meth:`iter_cursor`), so
+        questions are yielded once even when polls overlap. Between polls
+        the queue status is checked and a poll is only made if the number of
+        questions in state has changed, or max_interval has passed. The
+        interval halves while questions keep arriving and doubles while the
+        queue is idle.
+
+        cursor
+            A :class:`RabjCursor` to resume from, Eg: one saved by a
+            checkpoint
+
+        since
+            Start from this point in time instead of the beginning of the
+            queue when no cursor is given. Format is YYYY-MM-DD HH:MM:SS
+
+        min_interval, max_interval
+            Bounds in seconds of the time between status checks
 
-        raise StopIteration
+        checkpoint
+            A callable invoked with the cursor after every poll which
+            yielded questions, Eg: to save ``cursor.dumps()``
 
-    def get_all(self, state=None, body=True, judgments=False, since=None, pagesize=5000):
+        See iter_all for an explanation of the other parameters
+        """
+        if cursor is None:
+            cursor = RabjCursor(since)
+
+        interval = min_interval
+        last_count = None
+        last_poll = None
+        while True:
+            count = self._state_count(state)
+            if (last_poll is None or count is None or count != last_count
+                or time.time() - last_poll >= max_interval):
+                last_poll = time.time()
+                found = 0
+                for question in self.iter_cursor(cursor, state, body, judgments, pagesize):
+                    found += 1
+                    yield question
+                last_count = count
+
+                if found:
+                    _log.debug("Watch found %i questions %s", found, cursor)
+                    if checkpoint is not None:
+                        checkpoint(cursor)
+                    interval = max(min_interval, interval / 2)
+                else:
+                    interval = min(max_interval, interval * 2)
+            else:
+                interval = min(max_interval, interval * 2)
+
+            time.sleep(interval)
+
+    def get_all(self, state=None, body=True, judgments=False, since=None, pagesize=5000,
+                threads=None, prefetch=0, stream=False, store=None):
         """
         Get all the questions on the queue. See iter_all for an explanation
         of the parameters
         """
-        return list(self.iter_all(state, body, judgments, since, pagesize))
+        return list(self.iter_all(state, body, judgments, since, pagesize, threads, prefetch,
+                                  stream, store))
+
+    def update_many(self, questions, threads=None, full=False):
+        """
+        Saves the modifications to many questions, keeping up to threads
+        (default the ``threads`` attribute of the queue) requests in flight.
+        As with :meth:`RabjQuestion.update` only changed fields are sent and
+        unchanged questions are skipped. Changes to plain dicts are not
+        tracked, so they are sent whole. Questions which are sent are marked
+        clean.
+
+        Returns the number of questions sent. If any update fails the
+        others are still sent and a :class:`~rabj.api.RabjBatchError` is
+        raised holding that number, its failures are (question id,
+        exc_info) pairs.
+        """
+        if threads is None:
+            threads = self.threads
+
+        def update(question):
+            whole = full
+            if isinstance(question, RabjQuestion):
+                wrapped = question
+            elif isinstance(question, containers.RabjDict):
+                wrapped = RabjQuestion(question)
+            else:
+                wrapped = RabjQuestion(self.queue.container_factory.container(question))
+                whole = True
+            if not (whole or wrapped.dirty):
+                return False
+            wrapped.update(whole)
+            if wrapped is not question and isinstance(question, containers.RabjContainer):
+                question.mark_clean()
+            return True
+
+        sent = 0
+        total = 0
+        failures = []
+        for question, updated, exc in workers.run(update, questions, threads, ordered=False):
+            total += 1
+            if exc is not None:
+                _log.warn("Failed to update %s: %s", question['id'], exc[1])
+                failures.append((question['id'], exc))
+            elif updated:
+                sent += 1
+
+        _log.info("Updated %i of %i questions", sent, total)
+        if failures:
+            raise api.RabjBatchError(sent, failures, total)
+        return sent
+
+    def set_states(self, questions, state, threads=None, batchsize=1000, retries=3, backoff=0.5,
+                   progress=None):
+        """
+        Sets the state of many questions on this queue, Eg: to re-open the
+        questions of a bad judge.
+
+        questions
+            An iterable of question ids or questions, read batchsize at a
+            time
+
+        state
+            The new state of the questions
+
+        threads
+            The number of requests kept in flight, defaults to the
+            ``threads`` attribute of the queue
+
+        retries, backoff
+            Timeouts, connection errors and server errors are retried up to
+            retries times, waiting backoff seconds doubling on each attempt
+
+        progress
+            A callable invoked with the report after every batch
 
-    def remove(self, questions, delete=False):
+        Returns a report dict: the numbers of questions 'changed' and
+        'failed', the number of 'retries' and the 'seconds' taken. If any
+        question failed a :class:`~rabj.api.RabjBatchError` holding the
+        report is raised once all are done, its failures are (question id,
+        exc_info) pairs.
+        """
+        if threads is None:
+            threads = self.threads
+        # the queue id is a path below the state url, without the leading /
+        queueid = self.queue['id'].lstrip('/')
+
+        def set_state(qid):
+            attempt = 0
+            while True:
+                try:
+                    self._question(qid).state[queueid].put(state=state)
+                    return attempt
+                except Exception, e:
+                    if not tuning.retryable(e) or attempt >= retries:
+                        raise
+                    time.sleep(backoff * 2 ** attempt)
+                    attempt += 1
+
+        report = { 'changed': 0, 'failed': 0, 'retries': 0, 'seconds': 0.0 }
+        failures = []
+        start = time.time()
+        for batch in u.batches(_question_ids(questions), batchsize):
+            for qid, attempts, exc in workers.run(set_state, batch, threads, ordered=False):
+                if exc is not None:
+                    _log.warn("Failed to set the state of %s: %s", qid, exc[1])
+                    failures.append((qid, exc))
+                    report['failed'] += 1
+                else:
+                    report['changed'] += 1
+                    report['retries'] += attempts
+            _uncache_questions(self.queue.url, batch)
+
+            report['seconds'] = time.time() - start
+            _log.info("Set %(changed)i questions to %(state)s, %(failed)i failed",
+                      dict(report, state=state))
+            if progress is not None:
+                progress(report)
+
+        if failures:
+            raise api.RabjBatchError(report, failures, report['changed'] + report['failed'])
+        return report
+
+    def remove(self, questions, delete=False, threads=None):
         """
         Removes somes questions from a queue, does not delete questions by
         default.
@@ -339,36 +847,126 @@ class RabjQueue(object):
 
         delete
             Boolean indicating whether questions are deleted
+
+        threads
+            The number of questions deleted concurrently, defaults to the
+            ``threads`` attribute of the queue
+
+        If deleting any question fails the others are still deleted and a
+        :class:`~rabj.api.RabjBatchError` is raised holding the result of
+        the removal.
         """
-        resp, result = self.queue.questions.delete(questions=[{'id': q['id']} for q in questions])
+        questions = list(questions)
+        ids = [ q['id'] for q in questions ]
+        resp, result = self.queue.questions.delete(questions=[{'id': qid} for qid in ids])
+        _uncache_questions(self.queue.url, ids)
 
         if delete:
-            for q in questions:
-                q.delete()
+            failures = self._delete_questions(questions, threads)
+            if failures:
+                raise api.RabjBatchError(result, failures, len(questions))
 
         return result
 
-    def remove_all(self, delete=False):
+    def remove_all(self, delete=False, pagesize=1000, threads=None, progress=None):
         """
         Removes all questions from a queue, does not delete questions by
         default.
 
         delete
             Boolean indicating whether questions are deleted
+
+        pagesize
+            The number of questions removed per request, default is 1000
+
+        threads
+            The number of questions deleted concurrently, defaults to the
+            ``threads`` attribute of the queue
+
+        progress
+            A callable invoked with the numbers of questions removed and
+            deleted so far after every page
+
+        Only the ids of the questions are fetched, a page at a time from
+        the front of the queue, so the queue never has to fit in memory.
+        Returns a dict with the numbers of questions 'removed' and
+        'deleted'. Questions which fail to delete are reported in a
+        :class:`~rabj.api.RabjBatchError` once the queue is empty, holding
+        the counts as its results. Removal stops early with the same error
+        when a request fails or when the queue stops shrinking. Its
+        failures are (question id, exc_info) pairs, out of the number of
+        questions read from the queue.
         """
-        return self.remove(self.all_questions(), delete)
-    
-    def delete_cascade(self, questions):
+        counts = { 'removed': 0, 'deleted': 0 }
+        failures = []
+        attempted = 0
+        previous = None
+        while True:
+            resp, result = self.queue.questions.get(limit=pagesize, offset=0)
+            questions = result['questions']
+            if not len(questions):
+                break
+
+            # only ids are fetched (no body). Removed questions drop out of
+            # the queue, so each page is read from the front. The same page
+            # twice means nothing was removed
+            ids = [ q['id'] for q in questions ]
+            if set(ids) == previous:
+                exc = api.RabjError(None, 'NoProgress',
+                                    {'msg': "%i questions were not removed" % len(ids)}, None)
+                failures.extend([ (qid, (api.RabjError, exc, None)) for qid in ids ])
+                break
+            previous = set(ids)
+            attempted += len(ids)
+
+            try:
+                self.queue.questions.delete(questions=[{'id': qid} for qid in ids])
+            except Exception:
+                exc = sys.exc_info()
+                failures.extend([ (qid, exc) for qid in ids ])
+                break
+            _uncache_questions(self.queue.url, ids)
+            counts['removed'] += len(ids)
+
+            if delete:
+                page_failures = self._delete_questions(questions, threads)
+                failures.extend(page_failures)
+                counts['deleted'] += len(ids) - len(page_failures)
+
+            _log.info("Removed %(removed)i questions, deleted %(deleted)i", counts)
+            if progress is not None:
+                progress(counts['removed'], counts['deleted'])
+
+        if failures:
+            raise api.RabjBatchError(counts, failures, attempted)
+        return counts
+
+    def _delete_questions(self, questions, threads=None):
+        """Deletes questions on the worker pool, returning the failures as
+        (question id, exc_info) pairs"""
+        if threads is None:
+            threads = self.threads
+
+        failures = []
+        for q, result, exc in workers.run(lambda q: q.delete(), questions, threads,
+                                           ordered=False):
+            if exc is not None:
+                _log.warn("Failed to delete %s: %s", q['id'], exc[1])
+                failures.append((q['id'], exc))
+        return failures
+
+    def delete_cascade(self, questions, threads=None):
         """
         Removes some questions from a queue and deletes the questions.
         """
-        return self.remove(questions, delete=True)
+        return self.remove(questions, delete=True, threads=threads)
 
-    def delete_all_cascade(self):
+    def delete_all_cascade(self, pagesize=1000, threads=None, progress=None):
         """
-        Remove all questions from a queue and delete the questions.
+        Remove all questions from a queue and delete the questions, see
+        :meth:`remove_all`.
         """
-        return self.remove(self.all_questions(), delete=True)
+        return self.remove_all(True, pagesize, threads, progress)
 
     def publish(self):
         self.queue.published.put()
@@ -481,6 +1079,120 @@ class RabjQueue(object):
 
         return fetched
 
+def _question_ids(questions):
+    """The ids of questions, given as ids or questions"""
+    for question in questions:
+        if isinstance(question, basestring):
+            yield question
+        else:
+            yield question['id']
+
+def _get_questions(url, callable_for, questions, threads, ordered):
+    """Fetches the distinct questions on the host of url using the
+    RabjCallable returned by callable_for for each id, see
+    :meth:`RabjQueue.get_many`"""
+    def distinct():
+        seen = set()
+        for qid in _question_ids(questions):
+            if qid not in seen:
+                seen.add(qid)
+                yield qid
+
+    def fetch(qid):
+        question = _cached_question(url, qid)
+        if question is None:
+            resp, question = callable_for(qid).get()
+            _cache_question(question)
+        return RabjQuestion(question)
+
+    for qid, question, exc in workers.run(fetch, distinct(), threads, ordered):
+        if exc is not None:
+            _log.warn("Failed to fetch question %s: %s", qid, exc[1])
+        yield qid, question, exc
+
+def _cached_question(url, question_id):
+    """The question question_id from the question cache of the host of url,
+    None if there is no cache or the question isn't cached"""
+    cache = api.transport_for(url).question_cache
+    if cache is None:
+        return None
+    data = cache.get(question_id)
+    if data is None:
+        return None
+    return containers.RabjContainerFactory.for_url(url).container(data, url)
+
+def _cache_question(question):
+    """Stores question in the question cache of its host, if there is one"""
+    cache = api.transport_for(question.url).question_cache
+    if cache is not None:
+        cache.put(question)
+
+def _uncache_questions(url, question_ids):
+    """Drops question_ids from the question cache of the host of url"""
+    cache = api.transport_for(url).question_cache
+    if cache is not None:
+        for question_id in question_ids:
+            cache.invalidate(question_id)
+
+class RabjCursor(object):
+    """
+    The position of a keyset scan over a queue, see
+    :meth:`RabjQueue.iter_cursor`. A cursor holds the latest timestamp seen
+    and the ids of the questions seen with exactly that timestamp, which are
+    the only questions a following page can repeat. This keeps the cursor
+    small however many questions have been scanned.
+
+    since
+        The timestamp to resume from. Format is YYYY-MM-DD HH:MM:SS
+
+    seen
+        Ids of the questions already seen with timestamp ``since``
+
+    field
+        The question field holding the timestamp, default is 'timestamp'
+    """
+    def __init__(self, since=None, seen=(), field='timestamp'):
+        self.since = since
+        self.seen = set(seen)
+        self.field = field
+
+    def __repr__(self):
+        return "<%s since %s (%i seen)>" % (self.__class__.__name__, self.since, len(self.seen))
+
+    def advance(self, question):
+        """
+        Moves the cursor past question. Returns False if the question was
+        already seen and should be skipped.
+        """
+        qid = question['id']
+        key = question.get(self.field)
+        if key is None:
+            _log.debug("Question %s has no %s, cannot advance cursor", qid, self.field)
+            key = self.since
+
+        if self.since is None or key > self.since:
+            self.since = key
+            self.seen = set([qid])
+            return True
+        elif key == self.since and qid not in self.seen:
+            self.seen.add(qid)
+            return True
+        else:
+            return False
+
+    def jsonable(self):
+        return { 'since': self.since, 'seen': sorted(self.seen), 'field': self.field }
+
+    def dumps(self):
+        """Serializes the cursor to a json string"""
+        return u.json.dumps(self.jsonable())
+
+    @classmethod
+    def loads(cls, string):
+        """Creates a cursor from a string produced by :meth:`dumps`"""
+        saved = u.json.loads(string)
+        return cls(saved['since'], saved['seen'], saved.get('field', 'timestamp'))
+
 class RabjQuestion(containers.RabjDict):
     """
     A wrapper class around a rabj question, provides convenience methods for
@@ -488,12 +1200,16 @@ class RabjQuestion(containers.RabjDict):
     dictionary (though it cannot be serialized) allowing fields to be read and
     set.
     """
-    
+    __slots__ = ()
+
     def __init__(self, question=None, server=None, id=None):
         assert (question!=None) ^ ((server!=None) & (id!=None))
 
         if not question:
-            resp, question = api.RabjCallable(server)[id].get()
+            question = _cached_question(server, id)
+        if not question:
+            resp, question = api.RabjCallable(server).for_path(id).get()
+            _cache_question(question)
 
         # copies from the question rabj dict to this object
         self.copy_from_other(question)
@@ -507,24 +1223,41 @@ class RabjQuestion(containers.RabjDict):
 
     def set_state(self, queueid, state):
         """
-        Sets the current state of the question
+        Sets the current state of the question. To set the state of many
+        questions see :meth:`RabjQueue.set_states`
         """
         resp, result = self.state[queueid].put(state=state)
+        _uncache_questions(self.url, [self['id']])
         return result
     
-    def update(self):
-        """Saves modifications to the question"""
-        resp, result = self.http_put(question=self)
+    def update(self, full=False):
+        """
+        Saves modifications to the question. Only the fields changed since
+        the question was fetched (see :attr:`~rabj.containers.RabjContainer.dirty`)
+        are sent, deleted fields as null, and nothing is sent if none were
+        changed. full sends the whole question.
+        """
+        if full:
+            payload = self
+        elif self.dirty:
+            payload = self.changes()
+        else:
+            return self
+
+        resp, result = self.http_put(question=payload)
         self.copy_from_other(result)
+        _cache_question(self)
         return self
 
     def delete(self):
         """Deletes the question from rabj"""
         resp, result = self.http_delete()
+        _uncache_questions(self.url, [self['id']])
         return result
         
     def judgments(self):
-        """Fetches this questions judgments"""
+        """Fetches this questions judgments. To fetch the judgments of many
+        questions see :meth:`RabjQueue.judgments_for`"""
         resp, result = self['judgments'].get()
         return result['judgments']
     
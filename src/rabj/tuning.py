@@ -0,0 +1,140 @@
+'''
+tuning.py
+
+Adaptive sizing of the pages of questions fetched from or sent to rabj
+'''
+import logging, socket, threading, time
+import api
+
+_log = logging.getLogger("pyrabj.tuning")
+
+def retryable(exc):
+    """
+    True if exc is a failure which may succeed with a smaller request:
+    timeouts, connection errors and server errors (5xx)
+    """
+    if isinstance(exc, (socket.timeout, socket.error)):
+        return True
+    if isinstance(exc, api.RabjError):
+        try:
+            return int(exc.error_code) >= 500
+        except (TypeError, ValueError):
+            return False
+    return False
+
+class PageSizer(object):
+    """
+    Chooses the number of questions per request from the latency, size and
+    errors of the previous requests. The size grows multiplicatively while
+    the time per question keeps falling, steps back once it starts to rise
+    and backs off sharply on timeouts and server errors. After stepping back
+    the size is held for probe_after requests before growing again.
+    Requests slower than max_latency or with bodies larger than max_bytes
+    shrink the size in proportion.
+
+    The current size is available as ``size`` and the last measurements as
+    ``history``, a list of (size, seconds, bytes, ok) tuples, for
+    monitoring. A sizer may be shared between threads.
+    """
+    def __init__(self, initial=500, minimum=10, maximum=20000, max_latency=30.0,
+                 max_bytes=32*1024*1024, growth=2.0, backoff=0.5, tolerance=1.25,
+                 retries=3, probe_after=20, history=100):
+        self.size = initial
+        self.minimum = minimum
+        self.maximum = maximum
+        self.max_latency = max_latency
+        self.max_bytes = max_bytes
+        self.growth = growth
+        self.backoff = backoff
+        self.tolerance = tolerance
+        self.retries = retries
+        self.probe_after = probe_after
+        self.history = []
+        self._history_len = history
+        self._best = None
+        self._ceiling = None
+        self._holds = 0
+        self._lock = threading.Lock()
+
+    def __repr__(self):
+        return "<%s size=%i>" % (self.__class__.__name__, self.size)
+
+    def success(self, size, elapsed, nbytes=0, count=None):
+        """Records a request for size questions which took elapsed seconds
+        and returned nbytes and count questions, default is size"""
+        if count is None:
+            count = size
+        self._lock.acquire()
+        try:
+            self._record(size, elapsed, nbytes, True)
+            if count < size or size < self.size:
+                # a short final page or a stale measurement says nothing
+                return
+
+            per_question = elapsed / size
+            if elapsed > self.max_latency or nbytes > self.max_bytes:
+                scale = min(self.max_latency / max(elapsed, 1e-6),
+                            float(self.max_bytes) / max(nbytes, 1))
+                self._resize(size * scale)
+            elif self._best is None or per_question <= self._best * self.tolerance:
+                self._best = min(self._best or per_question, per_question)
+                if self._ceiling is None or size * self.growth < self._ceiling:
+                    self._resize(size * self.growth)
+                else:
+                    # hold below the size where latency rose, probing again later
+                    self._holds += 1
+                    if self._holds >= self.probe_after:
+                        self._ceiling = None
+                        self._holds = 0
+            else:
+                # latency has started to rise, step back and hold
+                self._ceiling = size
+                self._holds = 0
+                self._resize(size / self.growth)
+        finally:
+            self._lock.release()
+
+    def failure(self, size, exc):
+        """Records a failed request of size questions"""
+        self._lock.acquire()
+        try:
+            self._record(size, None, None, False)
+            self._best = None
+            self._resize(min(size, self.size) * self.backoff)
+        finally:
+            self._lock.release()
+
+    def call(self, func, limit=None):
+        """
+        Calls func with the current size (but no more than limit) and
+        returns ``(size, result)``. func must return a
+        (:class:`~rabj.api.RabjResponse`, result) pair, where result holds
+        the questions returned under 'questions'. Retryable failures
+        shrink the size and retry up to ``retries`` times.
+        """
+        attempt = 0
+        while True:
+            size = self.size if limit is None else min(self.size, limit)
+            start = time.time()
+            try:
+                resp, result = func(size)
+            except Exception, e:
+                if not retryable(e) or attempt >= self.retries:
+                    raise
+                attempt += 1
+                _log.warn("Request for %i questions failed (%s), retrying", size, e)
+                self.failure(size, e)
+            else:
+                self.success(size, time.time() - start, resp.size,
+                             len(result['questions']))
+                return size, (resp, result)
+
+    def _record(self, size, elapsed, nbytes, ok):
+        self.history.append((size, elapsed, nbytes, ok))
+        del self.history[:-self._history_len]
+
+    def _resize(self, size):
+        size = int(max(self.minimum, min(self.maximum, size)))
+        if size != self.size:
+            _log.info("Page size changed from %i to %i", self.size, size)
+            self.size = size
@@ -3,7 +3,7 @@ util.py
 
 Utilities functions and class for using the Rabj APIs
 '''
-import logging, urlparse
+import itertools, logging, urlparse
 
 try:
     import happy.json
@@ -62,3 +62,143 @@ def path(url):
     pr = urlparse.urlsplit(url)
     return pr.path
  
+
+def walk(obj, path):
+    """
+    The object found by following the keys in path from obj
+    """
+    for key in path:
+        obj = obj[key]
+    return obj
+
+def batches(iterable, size):
+    """
+    Yields lists of size items from iterable, the last one possibly shorter
+    """
+    iterator = iter(iterable)
+    while True:
+        batch = list(itertools.islice(iterator, size))
+        if not batch:
+            break
+        yield batch
+
+class JsonStreamDecoder(object):
+    """
+    Decodes a json document read in chunks and yields the elements of the
+    array found at path one at a time, so the array is never held in memory
+    as a whole. Once the iteration is over the rest of the document is
+    available as ``envelope``, with the array replaced by an empty list.
+
+    read
+        A callable taking a number of bytes and returning a (possibly
+        shorter) utf-8 encoded chunk, or an empty string at the end
+
+    path
+        The keys leading to the array, Eg: ('result', 'questions')
+    """
+    def __init__(self, read, path, chunksize=64*1024):
+        import codecs
+        try:
+            from json import decoder as jsondecoder
+        except ImportError:
+            from simplejson import decoder as jsondecoder
+        self._read = read
+        self._path = list(path)
+        self._chunksize = chunksize
+        self._utf8 = codecs.getincrementaldecoder('utf-8')()
+        self._decoder = jsondecoder.JSONDecoder()
+        self._scanstring = jsondecoder.scanstring
+        self._buf = u''
+        self._pos = 0
+        self._eof = False
+        self._skeleton = []
+        self.envelope = None
+
+    def __iter__(self):
+        # each frame of the stack is [kind, key, expecting_key]
+        stack = []
+        while True:
+            if not self._fill():
+                break
+            char = self._buf[self._pos]
+            if char == '"':
+                try:
+                    string, end = self._scanstring(self._buf, self._pos + 1)
+                except ValueError:
+                    if self._more():
+                        continue
+                    raise
+                if stack and stack[-1][0] == '{' and stack[-1][2]:
+                    stack[-1][1] = string
+                    stack[-1][2] = False
+                self._skip_to(end)
+            elif char == '{':
+                stack.append(['{', None, True])
+                self._skip_to(self._pos + 1)
+            elif char == '[':
+                self._skip_to(self._pos + 1)
+                keys = [ frame[1] for frame in stack ]
+                if keys == self._path and all(frame[0] == '{' for frame in stack):
+                    for item in self._items():
+                        yield item
+                else:
+                    stack.append(['[', None, False])
+            elif char in '}]':
+                stack.pop()
+                self._skip_to(self._pos + 1)
+            elif char == ',':
+                if stack and stack[-1][0] == '{':
+                    stack[-1][2] = True
+                self._skip_to(self._pos + 1)
+            else:
+                self._skip_to(self._pos + 1)
+
+        self.envelope = json.loads(u''.join(self._skeleton))
+
+    def _items(self):
+        """Decodes the elements of the array whose '[' was just read"""
+        while True:
+            if not self._fill():
+                raise ValueError("Unterminated array in json stream")
+            char = self._buf[self._pos]
+            if char.isspace() or char == ',':
+                self._pos += 1
+            elif char == ']':
+                self._skip_to(self._pos + 1)
+                return
+            else:
+                try:
+                    item, end = self._decoder.raw_decode(self._buf, self._pos)
+                except ValueError:
+                    if self._more():
+                        continue
+                    raise
+                if (end == len(self._buf) or self._buf[end] not in ' \t\r\n,]') \
+                        and self._more():
+                    # a number may continue in the next chunk, Eg: "-1." of "-1.5"
+                    continue
+                self._pos = end
+                yield item
+
+    def _skip_to(self, end):
+        """Copies the text up to end into the skeleton"""
+        self._skeleton.append(self._buf[self._pos:end])
+        self._pos = end
+
+    def _fill(self):
+        """Makes sure there is unread text, False at the end of the stream"""
+        while self._pos >= len(self._buf):
+            if not self._more():
+                return False
+        return True
+
+    def _more(self):
+        """Reads another chunk, False if the stream is exhausted"""
+        if self._eof:
+            return False
+        chunk = self._read(self._chunksize)
+        if not chunk:
+            self._eof = True
+        self._buf = self._buf[self._pos:] + self._utf8.decode(chunk, self._eof)
+        self._pos = 0
+        return True
@@ -0,0 +1,300 @@
+'''
+workers.py
+
+A minimal thread pool used to issue rabj requests concurrently. Only the
+threading and Queue modules are used so the pool also works on Jython.
+'''
+import logging, sys, threading, Queue
+
+_log = logging.getLogger("pyrabj.workers")
+
+_STOP = object()
+
+def run(func, iterable, threads, ordered=True, window=None):
+    """
+    Applies func to every item of iterable using a pool of worker threads and
+    yields ``(item, result, exc_info)`` triples. ``exc_info`` is None when
+    func succeeded, otherwise it is the :func:`sys.exc_info` of the failure
+    and ``result`` is None. A failing item never stops the others.
+
+    func
+        A callable taking a single item
+
+    iterable
+        The items to process. It is consumed lazily from the calling thread,
+        so generators are safe to pass in
+
+    threads
+        The number of worker threads. With one thread (or fewer) func is
+        simply called inline
+
+    ordered
+        Yield results in the order of iterable (the default) or as soon as
+        they complete
+
+    window
+        The maximum number of items submitted but not yet yielded, which
+        bounds the memory held by the pool. Defaults to twice the number of
+        threads
+    """
+    if threads <= 1:
+        for item in iterable:
+            try:
+                yield item, func(item), None
+            except Exception:
+                yield item, None, sys.exc_info()
+        return
+
+    window = max(window or 2 * threads, threads)
+    tasks = Queue.Queue()
+    done = Queue.Queue()
+
+    def work():
+        while True:
+            task = tasks.get()
+            if task is _STOP:
+                return
+            seq, item = task
+            try:
+                done.put((seq, item, func(item), None))
+            except Exception:
+                done.put((seq, item, None, sys.exc_info()))
+
+    workers = [ threading.Thread(target=work, name="pyrabj-worker-%i" % i)
+                for i in range(threads) ]
+    for worker in workers:
+        worker.setDaemon(True)
+        worker.start()
+
+    items = iter(iterable)
+    exhausted = False
+    submitted = yielded = 0
+    pending = {}
+    try:
+        while True:
+            while not exhausted and submitted - yielded < window:
+                try:
+                    item = items.next()
+                except StopIteration:
+                    exhausted = True
+                    break
+                tasks.put((submitted, item))
+                submitted += 1
+
+            if exhausted and yielded == submitted:
+                break
+
+            seq, item, result, exc = done.get()
+            if not ordered:
+                yielded += 1
+                yield item, result, exc
+                continue
+
+            pending[seq] = (item, result, exc)
+            while yielded in pending:
+                outcome = pending.pop(yielded)
+                yielded += 1
+                yield outcome
+    finally:
+        # drop work which hasn't started yet if the caller stopped early
+        try:
+            while True:
+                tasks.get_nowait()
+        except Queue.Empty:
+            pass
+        for worker in workers:
+            tasks.put(_STOP)
+
+def imap(func, iterable, threads, ordered=True, window=None):
+    """
+    Like :func:`run` but yields only the results. The first failure is
+    re-raised in the calling thread, at its position in the output.
+    """
+    for item, result, exc in run(func, iterable, threads, ordered, window):
+        if exc is not None:
+            raise exc[0], exc[1], exc[2]
+        yield result
+
+def prefetch(iterable, depth):
+    """
+    Iterates over iterable in a background thread, keeping up to depth items
+    ready ahead of the caller. An item counts against depth from the moment
+    it is requested from iterable until the caller takes it, so at most
+    depth items are held besides the one the caller is using. Exceptions
+    raised by iterable are re-raised in the calling thread when their
+    position is reached.
+    """
+    ready = Queue.Queue()
+    slots = Queue.Queue()
+    for i in range(max(depth, 1)):
+        slots.put(None)
+    stopped = threading.Event()
+
+    def reserve():
+        # wait for the caller to take an item, giving up if it has gone away
+        while not stopped.isSet():
+            try:
+                slots.get(True, 0.1)
+                return True
+            except Queue.Empty:
+                pass
+        return False
+
+    def produce():
+        try:
+            items = iter(iterable)
+            while reserve():
+                try:
+                    item = items.next()
+                except StopIteration:
+                    ready.put((_STOP, None))
+                    return
+                ready.put((item, None))
+        except Exception:
+            ready.put((None, sys.exc_info()))
+
+    producer = threading.Thread(target=produce, name="pyrabj-prefetch")
+    producer.setDaemon(True)
+    producer.start()
+    try:
+        while True:
+            item, exc = ready.get()
+            slots.put(None)
+            if exc is not None:
+                raise exc[0], exc[1], exc[2]
+            if item is _STOP:
+                return
+            yield item
+    finally:
+        stopped.set()
+
+class Future(object):
+    """
+    The pending result of a call submitted to an :class:`Executor`. Callbacks
+    registered with :meth:`add_done_callback` run in the worker thread which
+    completed the call (or immediately if it is already done), which makes it
+    easy to hand results back to an event loop.
+    """
+    def __init__(self):
+        self._cond = threading.Condition()
+        self._done = False
+        self._result = None
+        self._exc = None
+        self._callbacks = []
+
+    def done(self):
+        """True once the call has completed, successfully or not"""
+        return self._done
+
+    def result(self, timeout=None):
+        """Waits for the call to complete and returns its result, re-raising
+        its exception if it failed"""
+        exc = self.exception(timeout)
+        if exc is not None:
+            raise exc[0], exc[1], exc[2]
+        return self._result
+
+    def exception(self, timeout=None):
+        """Waits for the call to complete and returns its exc_info, or None
+        if it succeeded"""
+        self._cond.acquire()
+        try:
+            if not self._done:
+                self._cond.wait(timeout)
+            if not self._done:
+                raise RuntimeError("Timed out waiting for result")
+            return self._exc
+        finally:
+            self._cond.release()
+
+    def add_done_callback(self, fn):
+        """Calls fn with this future once it completes"""
+        self._cond.acquire()
+        try:
+            if not self._done:
+                self._callbacks.append(fn)
+                return
+        finally:
+            self._cond.release()
+        fn(self)
+
+    def set_result(self, result):
+        self._complete(result, None)
+
+    def set_exception(self, exc_info):
+        self._complete(None, exc_info)
+
+    def _complete(self, result, exc):
+        self._cond.acquire()
+        try:
+            self._result, self._exc, self._done = result, exc, True
+            callbacks, self._callbacks = self._callbacks, []
+            self._cond.notifyAll()
+        finally:
+            self._cond.release()
+
+        for fn in callbacks:
+            try:
+                fn(self)
+            except Exception:
+                _log.exception("Future callback %r failed", fn)
+
+class Executor(object):
+    """
+    A fixed pool of worker threads executing submitted calls. The number of
+    threads is the limit on how many calls (and so requests) run at once;
+    further calls wait in a queue.
+    """
+    def __init__(self, threads=10):
+        self.threads = threads
+        self._tasks = Queue.Queue()
+        self._lock = threading.Lock()
+        self._workers = []
+        self._shutdown = False
+
+    def submit(self, func, *args, **kwargs):
+        """Schedules func(*args, **kwargs) and returns a :class:`Future`"""
+        if self._shutdown:
+            raise RuntimeError("Cannot submit to an executor which was shut down")
+
+        future = Future()
+        self._tasks.put((future, func, args, kwargs))
+        self._start_workers()
+        return future
+
+    def shutdown(self, wait=True):
+        """Stops the workers once queued calls have run"""
+        self._shutdown = True
+        for worker in self._workers:
+            self._tasks.put(_STOP)
+        if wait:
+            for worker in self._workers:
+                worker.join()
+
+    def _start_workers(self):
+        # threads are started on demand, up to the limit
+        if len(self._workers) >= self.threads:
+            return
+        self._lock.acquire()
+        try:
+            if len(self._workers) < self.threads:
+                worker = threading.Thread(target=self._work,
+                                          name="pyrabj-executor-%i" % len(self._workers))
+                worker.setDaemon(True)
+                worker.start()
+                self._workers.append(worker)
+        finally:
+            self._lock.release()
+
+    def _work(self):
+        while True:
+            task = self._tasks.get()
+            if task is _STOP:
+                return
+            future, func, args, kwargs = task
+            try:
+                result = func(*args, **kwargs)
+            except Exception:
+                future.set_exception(sys.exc_info())
+            else:
+                future.set_result(result)
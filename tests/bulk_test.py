@@ -0,0 +1,84 @@
+import unittest
+from rabj import api
+import standin
+
+def qid(n):
+    return '/rabj/store/questions/q%02i' % n
+
+class SetStatesTest(unittest.TestCase):
+    def setUp(self):
+        self.server = standin.StandInServer(
+            [ standin.question(n, '2010-01-01 00:00:%02i' % n) for n in range(5) ])
+        self.queue = self.server.queue()
+
+    def tearDown(self):
+        self.server.stop()
+
+    def test_set_states(self):
+        ids = [ q['id'] for q in self.server.questions[:3] ]
+        reports = []
+        report = self.queue.set_states(ids, 'wanting', threads=2, batchsize=2,
+                                       progress=lambda r: reports.append(dict(r)))
+        self.assertEqual((report['changed'], report['failed']), (3, 0))
+        self.assertEqual([ r['changed'] for r in reports ], [2, 3])
+        self.assertEqual([ q['state'] for q in self.server.questions ],
+                         ['wanting'] * 3 + ['complete'] * 2)
+
+        puts = [ path.split('?')[0] for path in self.server.requests if '/state/' in path ]
+        self.assertEqual(sorted(puts), [ '%s/state%s/' % (qid, standin.QUEUE) for qid in ids ])
+
+class RemoveAllTest(unittest.TestCase):
+    def setUp(self):
+        self.server = standin.StandInServer(
+            [ standin.question(n, '2010-01-01 00:00:%02i' % n) for n in range(7) ])
+        self.queue = self.server.queue()
+
+    def tearDown(self):
+        self.server.stop()
+
+    def remove_all(self, *args, **kwargs):
+        try:
+            self.queue.remove_all(*args, **kwargs)
+            self.fail("no RabjBatchError")
+        except api.RabjBatchError, e:
+            return e
+
+    def test_remove_all_pages(self):
+        progress = []
+        counts = self.queue.remove_all(pagesize=3, progress=lambda *c: progress.append(c))
+        self.assertEqual(counts, {'removed': 7, 'deleted': 0})
+        self.assertEqual(progress, [(3, 0), (6, 0), (7, 0)])
+        self.assertEqual(self.server.questions, [])
+        self.assertEqual(self.server.deleted, [])
+
+    def test_delete_all_cascade(self):
+        counts = self.queue.delete_all_cascade(pagesize=3, threads=2)
+        self.assertEqual(counts, {'removed': 7, 'deleted': 7})
+        self.assertEqual(sorted(self.server.deleted), [ qid(n) for n in range(7) ])
+
+    def test_delete_failures(self):
+        self.server.fail = lambda method, path, params: path in (qid(1), qid(5))
+        e = self.remove_all(True, pagesize=3, threads=2)
+        self.assertEqual(e.results, {'removed': 7, 'deleted': 5})
+        self.assertEqual(sorted(f[0] for f in e.failures), [qid(1), qid(5)])
+        self.assertEqual(e.msg.split(',')[0], "2 of 7 batches failed")
+
+    def test_removal_failure_stops(self):
+        self.server.fail = lambda method, path, params: \
+            method == 'DELETE' and path.endswith('/questions') and qid(3) in [ q['id'] for q in params['questions'] ]
+        e = self.remove_all(pagesize=3)
+        self.assertEqual(e.results, {'removed': 3, 'deleted': 0})
+        self.assertEqual([ f[0] for f in e.failures ], [qid(3), qid(4), qid(5)])
+        self.assertEqual(e.msg.split(',')[0], "3 of 6 batches failed")
+        self.assertEqual(len(self.server.questions), 4)
+
+    def test_no_progress_stops(self):
+        self.server.stuck = set([qid(3)])
+        e = self.remove_all(pagesize=1)
+        self.assertEqual(e.results, {'removed': 4, 'deleted': 0})
+        self.assertEqual(e.failures[0][0], qid(3))
+        self.assertEqual(e.error_class, 'NoProgress')
+        self.assertEqual(e.msg.split(',')[0], "1 of 4 batches failed")
+
+if __name__ == '__main__':
+    unittest.main()
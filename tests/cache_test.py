@@ -0,0 +1,124 @@
+import BaseHTTPServer, threading, unittest
+from rabj import api, cache
+from rabj.util import json
+
+class StandInHandler(BaseHTTPServer.BaseHTTPRequestHandler):
+    """Serves a queue status with an ETag and answers revalidations of an
+    unchanged status with a 304"""
+    protocol_version = 'HTTP/1.1'
+    version = 1
+    requests = []
+
+    def log_message(self, *args):
+        pass
+
+    def do_GET(self):
+        cls = StandInHandler
+        cls.requests.append((self.path, self.headers.get('If-None-Match')))
+        etag = '"v%i"' % cls.version
+        if self.headers.get('If-None-Match') == etag:
+            self.send_response(304)
+            self.send_header('ETag', etag)
+            self.send_header('Content-Length', '0')
+            self.end_headers()
+            return
+
+        body = json.dumps({'status': {'code': 200},
+                           'result': {'id': '/q', 'version': cls.version}})
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.send_header('ETag', etag)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_PUT(self):
+        StandInHandler.version += 1
+        self.rfile.read(int(self.headers['Content-Length']))
+        self.do_GET()
+
+class ResponseCacheTest(unittest.TestCase):
+    def setUp(self):
+        StandInHandler.version = 1
+        StandInHandler.requests = []
+        self.server = BaseHTTPServer.HTTPServer(('127.0.0.1', 0), StandInHandler)
+        thread = threading.Thread(target=self.server.serve_forever)
+        thread.setDaemon(True)
+        thread.start()
+        url = 'http://127.0.0.1:%i/' % self.server.server_address[1]
+        self.cache = cache.ResponseCache(maxsize=10, ttls=[(r'/fresh/$', 60)])
+        self.transport = api.RabjTransport(url, cache=self.cache)
+        self.rabj = api.RabjCallable(url, transport=self.transport)
+
+    def tearDown(self):
+        self.transport.clear()
+        self.server.shutdown()
+        self.server.server_close()
+
+    def test_revalidates_with_etag(self):
+        resp, first = self.rabj.status.get()
+        resp, second = self.rabj.status.get()
+        self.assertEqual(first['version'], second['version'])
+        self.assertEqual([etag for path, etag in StandInHandler.requests], [None, '"v1"'])
+        self.assertEqual(self.cache.revalidated, 1)
+
+    def test_fresh_responses_skip_the_server(self):
+        self.rabj.fresh.get()
+        self.rabj.fresh.get()
+        self.assertEqual(len(StandInHandler.requests), 1)
+        self.assertEqual(self.cache.hits, 1)
+
+    def test_writes_invalidate(self):
+        self.rabj.fresh.get()
+        self.rabj.fresh.put(version=2)
+        resp, result = self.rabj.fresh.get()
+        self.assertEqual(result['version'], 2)
+
+    def test_bounded_by_bytes(self):
+        responses = cache.ResponseCache(maxbytes=100)
+        resp = {'etag': '"v1"'}
+        for i in range(10):
+            responses.store('http://rabj/q/%i' % i, resp, 'x' * 40)
+        responses.store('http://rabj/big', resp, 'x' * 101)
+        self.assertEqual(responses.bytes, 80)
+        self.assertEqual(len(responses), 2)
+        self.assertEqual(responses.lookup('http://rabj/big'), None)
+        self.assertNotEqual(responses.lookup('http://rabj/q/9'), None)
+
+    def test_only_configured_paths(self):
+        responses = cache.ResponseCache(paths=[r'/status/$'])
+        resp = {'etag': '"v1"'}
+        responses.store('http://rabj/q/status/?access_key=k', resp, '{}')
+        responses.store('http://rabj/q/questions/?limit=5000', resp, '{}')
+        self.assertEqual(len(responses), 1)
+        self.assertNotEqual(responses.lookup('http://rabj/q/status/?access_key=k'), None)
+
+    def test_lru_is_bounded(self):
+        lru = cache.LRUCache(maxsize=2)
+        lru.put('a', 1)
+        lru.put('b', 2)
+        lru.get('a')
+        lru.put('c', 3)
+        self.assertEqual(sorted(lru.keys()), ['a', 'c'])
+
+class QuestionCacheTest(unittest.TestCase):
+    def test_lookups_return_copies(self):
+        questions = cache.QuestionCache()
+        questions.put({'id': '/q/1', 'tags': ['a']})
+        first = questions.get('/q/1')
+        first['tags'].append('b')
+        self.assertEqual(questions.get('/q/1')['tags'], ['a'])
+        self.assertEqual((questions.hits, questions.misses), (2, 0))
+        questions.invalidate('/q/1')
+        self.assertEqual(questions.get('/q/1'), None)
+
+    def test_bounded_by_bytes(self):
+        questions = cache.QuestionCache(maxbytes=100)
+        for i in range(10):
+            questions.put({'id': '/q/%i' % i, 'assertion': 'x' * 60})
+        self.assertTrue(questions.bytes <= 100)
+        self.assertEqual(len(questions), 1)
+        self.assertNotEqual(questions.get('/q/9'), None)
+
+if __name__ == '__main__':
+    unittest.main()
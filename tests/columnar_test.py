@@ -0,0 +1,59 @@
+import os, shutil, tempfile, unittest
+from rabj import columnar
+
+JUDGMENTS = [('/q/1', 'alice', 'yes'), ('/q/1', 'bob', 'no'), ('/q/2', 'alice', 'yes'),
+             ('/q/2', 'carol', 'reconciled:/r/1'), ('/q/3', 'bob', 'yes')]
+
+class JudgmentColumnsTest(unittest.TestCase):
+    def setUp(self):
+        if columnar.numpy is None:
+            self.skipTest("numpy is not installed")
+        self.columns = columnar.JudgmentColumns.from_tuples(iter(JUDGMENTS))
+        self.tmp = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp, ignore_errors=True)
+
+    def test_encoding(self):
+        columns = self.columns
+        self.assertEqual(len(columns), 5)
+        self.assertEqual(columns.questions.tolist(), [0, 0, 1, 1, 2])
+        self.assertEqual(columns.judges.tolist(), [0, 1, 0, 2, 1])
+        self.assertEqual(columns.value_coding.values, ['yes', 'no', 'reconciled:/r/1'])
+        self.assertEqual(list(columns), JUDGMENTS)
+
+    def test_select(self):
+        yes = self.columns.value_coding.code('yes')
+        selected = self.columns.select(self.columns.values == yes)
+        self.assertEqual([ j[0] for j in selected ], ['/q/1', '/q/2', '/q/3'])
+
+    def test_save_load(self):
+        for name in ('judgments', 'judgments.npz'):
+            path = os.path.join(self.tmp, name)
+            self.columns.save(path)
+            loaded = columnar.JudgmentColumns.load(path, mmap_mode='r')
+            self.assertEqual(list(loaded), JUDGMENTS)
+            self.assertEqual(loaded.judges.tolist(), self.columns.judges.tolist())
+
+    def test_matrix(self):
+        if columnar.scipy is None:
+            self.skipTest("scipy is not installed")
+        columns = columnar.JudgmentColumns.from_tuples(JUDGMENTS + [('/q/1', 'bob', 'yes')])
+        matrix = columns.matrix()
+        self.assertEqual(matrix.shape, (3, 3))
+        self.assertEqual(matrix.nnz, 5)
+        # bob's second judgment of /q/1 replaces the first
+        self.assertEqual(matrix.toarray().tolist(), [[1, 1, 0], [1, 0, 3], [0, 1, 0]])
+
+    def test_judgment_tuples(self):
+        questions = [{'id': '/q/1', 'judgments': [
+                         {'user': {'fb_user_id': 'alice'}, 'value': 'yes'},
+                         {'user': {'fb_user_id': 'bob'}, 'value': 'reconciled',
+                          '__metadata__': {'recon_id': '/r/1'}}]},
+                     {'id': '/q/2', 'judgments': [
+                         {'user': {'fb_user_id': 'alice'}, 'value': 'no'}]}]
+        self.assertEqual(list(columnar.judgment_tuples(questions, min=2)),
+                         [('/q/1', 'alice', 'yes'), ('/q/1', 'bob', 'reconciled:/r/1')])
+
+if __name__ == '__main__':
+    unittest.main()
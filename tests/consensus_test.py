@@ -0,0 +1,49 @@
+import unittest
+from rabj import columnar, consensus
+
+JUDGMENTS = [('/q/1', 'alice', 'yes'), ('/q/1', 'bob', 'yes'), ('/q/1', 'carol', 'no'),
+             ('/q/2', 'alice', 'no'), ('/q/2', 'bob', 'yes'),
+             ('/q/3', 'alice', 'yes'), ('/q/3', 'bob', 'yes'), ('/q/3', 'carol', 'yes'),
+             ('/q/4', 'alice', 'reconciled:/r/1'), ('/q/4', 'carol', 'reconciled:/r/2'),
+             ('/q/4', 'bob', 'no')]
+
+class ConsensusTest(unittest.TestCase):
+    def setUp(self):
+        if columnar.numpy is None:
+            self.skipTest("numpy is not installed")
+        columns = columnar.JudgmentColumns.from_tuples(JUDGMENTS)
+        self.consensus = consensus.Consensus(columns)
+
+    def test_answers(self):
+        self.assertEqual(self.consensus.answers(),
+                         {'/q/1': 'yes', '/q/3': 'yes', '/q/4': 'reconciled'})
+        self.assertEqual(self.consensus.answers('plurality'),
+                         {'/q/1': 'yes', '/q/3': 'yes', '/q/4': 'reconciled'})
+        answers, top, tied = self.consensus.plurality()
+        self.assertEqual(tied.tolist(), [False, True, False, False])
+
+    def test_fleiss_kappa(self):
+        # worked by hand: P = (1/3, 0, 1, 1/3), p = (6/11, 3/11, 2/11)
+        observed = (1/3. + 0 + 1 + 1/3.) / 4
+        expected = (36 + 9 + 4) / 121.
+        self.assertAlmostEqual(self.consensus.fleiss_kappa(),
+                               (observed - expected) / (1 - expected))
+
+    def test_cohen_kappa(self):
+        # alice and bob agree on q1 and q3 of q1-q4
+        observed = 0.5
+        expected = (2/4. * 3/4.) + (1/4. * 1/4.)
+        self.assertAlmostEqual(self.consensus.cohen_kappa('alice', 'bob'),
+                               (observed - expected) / (1 - expected))
+
+    def test_judge_accuracy(self):
+        accuracies = self.consensus.judge_accuracies()
+        self.assertEqual(accuracies['alice'], (1.0, 3))
+        self.assertEqual(accuracies['carol'], (2 / 3., 3))
+        self.assertEqual(accuracies['bob'][1], 3)
+
+    def test_reconciled(self):
+        self.assertEqual(self.consensus.reconciled(), {'/r/1': (1, 1), '/r/2': (1, 1)})
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,32 @@
+import unittest
+from rabj import containers
+
+URL = 'http://rabj.example.com/rabj/store/queues/q1/questions/'
+
+class RabjListTest(unittest.TestCase):
+    def setUp(self):
+        self.list = containers.RabjList([{'id': '/a'}, {'id': '/b'}, {'id': '/c'}], URL)
+
+    def test_negative_indices(self):
+        self.assertEqual(self.list[-1]['id'], '/c')
+        self.assertEqual(self.list[-3]['id'], '/a')
+        self.assertRaises(IndexError, lambda: self.list[-4])
+        self.assertRaises(IndexError, lambda: self.list[-5])
+        self.assertRaises(IndexError, lambda: self.list[3])
+
+    def test_children_are_cached(self):
+        self.assertTrue(self.list[0] is self.list[-3])
+        self.list[0] = {'id': '/d'}
+        self.assertEqual(self.list[0]['id'], '/d')
+
+class RabjContainerFactoryTest(unittest.TestCase):
+    def test_factory_for_a_full_url(self):
+        factory = containers.RabjContainerFactory(URL)
+        self.assertEqual((factory.url, factory.host_url), (URL, 'http://rabj.example.com'))
+        self.assertEqual(factory.container({'id': '/q/1'}).url, 'http://rabj.example.com/q/1')
+        self.assertEqual(factory.container([]).url, URL)
+        self.assertEqual(factory.container([], 'http://rabj.example.com/x/').url,
+                         'http://rabj.example.com/x/')
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,57 @@
+import unittest
+from rabj import simple
+import standin
+
+def ids(questions):
+    return [ q['id'] for q in questions ]
+
+def qid(n):
+    return '/rabj/store/questions/q%02i' % n
+
+class IterCursorTest(unittest.TestCase):
+    def setUp(self):
+        self.server = standin.StandInServer(
+            [ standin.question(n, '2010-01-01 00:00:%02i' % n) for n in range(10) ])
+        self.queue = self.server.queue()
+
+    def tearDown(self):
+        self.server.stop()
+
+    def test_full_scan(self):
+        cursor = simple.RabjCursor()
+        self.assertEqual(ids(self.queue.iter_cursor(cursor, pagesize=3)),
+                         [ qid(n) for n in range(10) ])
+        self.assertEqual(cursor.since, '2010-01-01 00:00:09')
+        self.assertEqual(cursor.seen, set([qid(9)]))
+        for path in self.server.requests[2:]:
+            self.assertTrue('since=' in path, path)
+
+    def test_resume_from_dumps(self):
+        cursor = simple.RabjCursor()
+        scan = self.queue.iter_cursor(cursor, pagesize=3)
+        first = [ scan.next()['id'] for i in range(4) ]
+        saved = cursor.dumps()
+
+        self.server.questions.append(standin.question(10, '2010-01-01 00:00:10'))
+        cursor = simple.RabjCursor.loads(saved)
+        self.assertEqual(cursor.since, '2010-01-01 00:00:03')
+        rest = ids(self.queue.iter_cursor(cursor, pagesize=3))
+        self.assertEqual(first + rest, [ qid(n) for n in range(11) ])
+
+    def test_pages_sharing_one_timestamp(self):
+        # more questions share a timestamp than fit on a page, the scan has
+        # to step over them by offset rather than by since
+        self.server.questions = \
+            [ standin.question(0, '2010-01-01 00:00:00') ] + \
+            [ standin.question(n, '2010-01-01 00:00:01') for n in range(1, 8) ] + \
+            [ standin.question(8, '2010-01-01 00:00:02') ]
+        cursor = simple.RabjCursor()
+        self.assertEqual(ids(self.queue.iter_cursor(cursor, pagesize=3)),
+                         [ qid(n) for n in range(9) ])
+        self.assertTrue([ p for p in self.server.requests if 'offset=3' in p ])
+
+        again = simple.RabjCursor(cursor.since, cursor.seen)
+        self.assertEqual(ids(self.queue.iter_cursor(again, pagesize=3)), [])
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,35 @@
+import unittest
+from rabj import containers
+
+class DirtyTrackingTest(unittest.TestCase):
+    def setUp(self):
+        data = {'id': '/q/1', 'tags': ['a'], 'meta': {'id': '/m/1', 'x': 1}, 'body': 'big'}
+        self.question = containers.RabjDict(data, 'http://rabj.example.com/q/1')
+
+    def test_setitem_and_delitem(self):
+        self.assertEqual(self.question.dirty, frozenset())
+        self.question['tags'] = ['b']
+        del self.question['body']
+        self.assertEqual(self.question.changes(), {'id': '/q/1', 'tags': ['b'], 'body': None})
+        self.question.mark_clean()
+        self.assertEqual(self.question.dirty, frozenset())
+
+    def test_nested_changes_mark_the_owner(self):
+        self.question['tags'].append('b')
+        self.question['meta']['x'] = 2
+        self.assertEqual(self.question.dirty, frozenset(['tags', 'meta']))
+        self.assertEqual(self.question.changes()['tags'], ['a', 'b'])
+
+    def test_copy_tracks_its_own_changes(self):
+        page = containers.RabjList([self.question.data], 'http://rabj.example.com/q/')
+        original = page[0]
+        original['tags']
+        copy = containers.RabjDict(None, None)
+        copy.copy_from_other(original)
+        copy['tags'].append('b')
+        self.assertEqual(copy.dirty, frozenset(['tags']))
+        self.assertEqual(original.dirty, frozenset())
+        self.assertEqual(page.dirty, frozenset())
+
+if __name__ == '__main__':
+    unittest.main()
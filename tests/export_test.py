@@ -0,0 +1,81 @@
+import os, shutil, tempfile, unittest
+from rabj import api, export
+from rabj.util import json
+import standin
+
+def qid(n):
+    return '/rabj/store/questions/q%02i' % n
+
+class QueueExporterTest(unittest.TestCase):
+    def setUp(self):
+        self.server = standin.StandInServer(
+            [ standin.question(n, '2010-01-01 00:00:%02i' % n) for n in range(10) ])
+        self.queue = self.server.queue()
+        self.dir = tempfile.mkdtemp()
+        self.out = os.path.join(self.dir, 'export.json')
+        self.checkpoint = os.path.join(self.dir, 'export.ckpt')
+
+    def tearDown(self):
+        self.server.stop()
+        shutil.rmtree(self.dir)
+
+    def exported(self):
+        return [ json.loads(line)['id'] for line in open(self.out) ]
+
+    def fail_at(self, offset):
+        self.server.fail = lambda method, path, params: params.get('offset') == [str(offset)]
+
+    def test_export(self):
+        exporter = export.QueueExporter(self.queue, chunksize=3, threads=2)
+        stats = exporter.export(self.out)
+        self.assertEqual(self.exported(), [ qid(n) for n in range(10) ])
+        self.assertEqual((stats['questions'], stats['chunks']), (10, 4))
+
+    def test_resume_ordered(self):
+        self.fail_at(6)
+        exporter = export.QueueExporter(self.queue, chunksize=3, threads=1,
+                                        checkpoint=self.checkpoint)
+        self.assertRaises(api.RabjError, exporter.export, self.out)
+        self.assertEqual(self.exported(), [ qid(n) for n in range(6) ])
+
+        # a chunk written after the last checkpoint is dropped on resume
+        out = open(self.out, 'a')
+        out.write('{"id": "/rabj/store/questions/q06"}\n{"id": "/rabj/sto')
+        out.close()
+
+        self.server.fail = None
+        stats = exporter.export(self.out)
+        self.assertEqual(self.exported(), [ qid(n) for n in range(10) ])
+        self.assertEqual((stats['questions'], stats['chunks']), (10, 4))
+        self.assertEqual(len([ p for p in self.server.requests if 'offset=0' in p ]), 1)
+
+    def test_resume_unordered(self):
+        self.fail_at(3)
+        exporter = export.QueueExporter(self.queue, chunksize=3, threads=3, ordered=False,
+                                        checkpoint=self.checkpoint)
+        self.assertRaises(api.RabjError, exporter.export, self.out)
+        self.assertTrue(qid(3) not in self.exported())
+
+        self.server.fail = None
+        exporter.export(self.out)
+        self.assertEqual(sorted(self.exported()), [ qid(n) for n in range(10) ])
+
+    def test_checkpoint_for_another_export(self):
+        export.QueueExporter(self.queue, chunksize=3, checkpoint=self.checkpoint).export(self.out)
+        exporter = export.QueueExporter(self.queue, chunksize=4, checkpoint=self.checkpoint)
+        self.assertRaises(ValueError, exporter.export, self.out)
+
+    def test_start_and_num(self):
+        exporter = export.QueueExporter(self.queue, chunksize=2, threads=2, start=2, num=5)
+        stats = exporter.export(self.out)
+        self.assertEqual(self.exported(), [ qid(n) for n in range(2, 7) ])
+        self.assertEqual(stats['chunks'], 3)
+
+    def test_queue_grown_since_planned(self):
+        exporter = export.QueueExporter(self.queue, chunksize=5, threads=1)
+        exporter._plan = lambda: [0]
+        exporter.export(self.out)
+        self.assertEqual(self.exported(), [ qid(n) for n in range(10) ])
+
+if __name__ == '__main__':
+    unittest.main()
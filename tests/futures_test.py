@@ -0,0 +1,153 @@
+import sys, threading, time, unittest
+from rabj import futures, workers
+import standin
+
+def completed(result=None, error=None):
+    future = workers.Future()
+    if error is not None:
+        try:
+            raise error
+        except Exception:
+            future.set_exception(sys.exc_info())
+    else:
+        future.set_result(result)
+    return future
+
+class FutureTest(unittest.TestCase):
+    def test_result_and_callbacks(self):
+        future = workers.Future()
+        seen = []
+        future.add_done_callback(seen.append)
+        self.assertFalse(future.done())
+        self.assertRaises(RuntimeError, future.result, 0.01)
+        future.set_result(1)
+        future.add_done_callback(seen.append)
+        self.assertEqual(future.result(), 1)
+        self.assertEqual(seen, [future, future])
+
+    def test_exception_is_reraised(self):
+        future = completed(error=ValueError('bad'))
+        self.assertEqual(future.exception()[0], ValueError)
+        self.assertRaises(ValueError, future.result)
+
+class ExecutorTest(unittest.TestCase):
+    def setUp(self):
+        self.executor = workers.Executor(threads=2)
+
+    def tearDown(self):
+        self.executor.shutdown()
+
+    def test_limits_concurrency(self):
+        lock = threading.Lock()
+        running = [0, 0]
+        def call(i):
+            lock.acquire()
+            running[0] += 1
+            running[1] = max(running)
+            lock.release()
+            time.sleep(0.02)
+            lock.acquire()
+            running[0] -= 1
+            lock.release()
+            return i
+        submitted = [ self.executor.submit(call, i) for i in range(8) ]
+        self.assertEqual([ f.result(5) for f in submitted ], range(8))
+        self.assertEqual(running[1], 2)
+        self.assertEqual(len(self.executor._workers), 2)
+
+    def test_errors_and_shutdown(self):
+        failed = self.executor.submit(int, 'x')
+        self.assertRaises(ValueError, failed.result, 5)
+        self.executor.shutdown()
+        self.assertRaises(RuntimeError, self.executor.submit, int, '1')
+
+class CombinatorTest(unittest.TestCase):
+    def test_gather_keeps_order(self):
+        first, second = workers.Future(), workers.Future()
+        gathered = futures._gather([first, second])
+        second.set_result([3, 4])
+        self.assertFalse(gathered.done())
+        first.set_result([1, 2])
+        self.assertEqual(gathered.result(), [1, 2, 3, 4])
+        self.assertEqual(futures._gather([]).result(), [])
+
+    def test_gather_fails_with_the_first_failure(self):
+        pending = workers.Future()
+        gathered = futures._gather([pending, completed(error=KeyError('x'))])
+        self.assertRaises(KeyError, gathered.result, 1)
+        pending.set_result([1])
+        self.assertRaises(KeyError, gathered.result, 1)
+
+    def test_chain(self):
+        source = workers.Future()
+        chained = futures._chain(source, lambda n: completed(n + 1))
+        source.set_result(1)
+        self.assertEqual(chained.result(1), 2)
+
+        failed = futures._chain(completed(error=KeyError('x')), lambda n: completed(n))
+        self.assertRaises(KeyError, failed.result, 1)
+        broken = futures._chain(completed(1), lambda n: n['x'])
+        self.assertRaises(TypeError, broken.result, 1)
+
+class PostedPages(object):
+    """Stands in for a RabjQueue, records the pages posted by add_all"""
+    def __init__(self):
+        self.pages = []
+        self.posted = threading.Event()
+
+    def add_all(self, page, pagesize):
+        self.pages.append(page)
+        self.posted.set()
+        if page[0][0] == 'fail':
+            raise ValueError(page)
+        return [ assertion for assertion, answerspace, meta in page ]
+
+class AsyncRabjQueueTest(unittest.TestCase):
+    def setUp(self):
+        self.executor = workers.Executor(threads=2)
+
+    def tearDown(self):
+        self.executor.shutdown()
+
+    def test_add_all_posts_pages_as_they_are_read(self):
+        queue = PostedPages()
+        def three_tuples():
+            for i in range(5):
+                if i == 2:
+                    # the first page is posted before the rest is read
+                    self.assertTrue(queue.posted.wait(5))
+                yield 'a%i' % i, [], {}
+        added = futures.AsyncRabjQueue(queue, self.executor).add_all(three_tuples(), 2)
+        self.assertEqual(added.result(5), ['a0', 'a1', 'a2', 'a3', 'a4'])
+        self.assertEqual([ len(page) for page in queue.pages ], [2, 2, 1])
+
+    def test_add_all_failure(self):
+        queue = PostedPages()
+        tuples = [ ('a', [], {}), ('fail', [], {}) ]
+        added = futures.AsyncRabjQueue(queue, self.executor).add_all(tuples, 1)
+        self.assertRaises(ValueError, added.result, 5)
+
+class AsyncRabjServerTest(unittest.TestCase):
+    def setUp(self):
+        self.server = standin.StandInServer(
+            [ standin.question(n, '2010-01-01 00:00:%02i' % n) for n in range(10) ])
+        self.rabj = futures.AsyncRabjServer(self.server.url, threads=3)
+
+    def tearDown(self):
+        self.rabj.shutdown()
+        self.server.stop()
+
+    def test_get_all_and_add_all(self):
+        queue = self.rabj.get_queue(standin.QUEUE, standin.ACCESS_KEY).result(5)
+        questions = queue.get_all(pagesize=3).result(5)
+        self.assertEqual([ q['id'] for q in questions ],
+                         [ '/rabj/store/questions/q%02i' % n for n in range(10) ])
+
+        added = queue.add_all([ ('new %i' % i, [], {}) for i in range(5) ], 2).result(5)
+        self.assertEqual([ q['assertion'] for q in added ], [ 'new %i' % i for i in range(5) ])
+        self.assertEqual(queue.status().result(5), {'complete': 10, 'incomplete': 5,
+                                                    'questions': 15, 'started': 0,
+                                                    'judgments': 0})
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,86 @@
+import unittest
+from rabj import localstore, mirror
+import standin
+
+def questions():
+    return [ standin.question(0, '2010-01-01 00:00:00', 'complete', ['red'],
+                              [('/user/a', 'yes'), ('/user/b', 'no')]),
+             standin.question(1, '2010-01-01 00:00:01', 'complete', ['blue'],
+                              [('/user/a', 'no')]),
+             standin.question(2, '2010-01-01 00:00:02', 'wanting', ['red']),
+             standin.question(3, '2010-01-01 00:00:03', 'complete', ['red', 'blue'],
+                              [('/user/b', 'yes')]) ]
+
+class QuestionStoreTest(unittest.TestCase):
+    def setUp(self):
+        if localstore.sqlite3 is None:
+            self.skipTest("sqlite3 is not available")
+        self.server = standin.StandInServer(questions())
+        self.queue = self.server.queue()
+        self.store = localstore.QuestionStore(':memory:')
+
+    def tearDown(self):
+        self.store.close()
+        self.server.stop()
+
+    def ids(self, questions):
+        return [ q['id'] for q in questions ]
+
+    def test_sync_and_resync(self):
+        self.assertEqual(self.store.sync(self.queue, 'complete', True, pagesize=2), 3)
+        self.assertEqual(self.store.sync(self.queue, 'complete', True, pagesize=2), 0)
+
+        self.server.questions.append(
+            standin.question(4, '2010-01-01 00:00:04', 'complete', judgments=[('/user/a', 'yes')]))
+        self.assertEqual(self.store.sync(self.queue, 'complete', True, pagesize=2), 1)
+        self.assertEqual(self.ids(self.store.iter_all(self.queue, 'complete', True, sync=False)),
+                         ['/rabj/store/questions/q%02i' % i for i in (0, 1, 3, 4)])
+        self.assertEqual(len(self.store.get('/rabj/store/questions/q04')['judgments']), 1)
+
+    def test_queue_iter_all_reads_through_the_store(self):
+        first = self.ids(self.queue.iter_all(state='complete', judgments=True, store=self.store))
+        requests = len(self.server.requests)
+        second = self.ids(self.queue.iter_all(state='complete', judgments=True, store=self.store))
+        self.assertEqual(first, second)
+        # the second scan only checks for new questions
+        self.assertEqual(len(self.server.requests), requests + 1)
+
+class QueueMirrorTest(QuestionStoreTest):
+    def setUp(self):
+        super(QueueMirrorTest, self).setUp()
+        self.mirror = mirror.QueueMirror(self.queue)
+
+    def tearDown(self):
+        self.mirror.close()
+        super(QueueMirrorTest, self).tearDown()
+
+    def test_sync_all_and_query(self):
+        self.assertEqual(self.mirror.sync_all(pagesize=2), 4)
+        self.assertEqual(self.mirror.counts(), {'complete': 3, 'wanting': 1})
+        self.assertEqual(self.ids(self.mirror.query(state='wanting')),
+                         ['/rabj/store/questions/q02'])
+        self.assertEqual(sorted(self.ids(self.mirror.query(tag='red', state='complete'))),
+                         ['/rabj/store/questions/q00', '/rabj/store/questions/q03'])
+        self.assertEqual(sorted(self.ids(self.mirror.query(user='/user/b'))),
+                         ['/rabj/store/questions/q00', '/rabj/store/questions/q03'])
+        self.assertEqual(sorted(self.ids(self.mirror.query(user='/user/a', value='no'))),
+                         ['/rabj/store/questions/q01'])
+
+    def test_resync_moves_questions_between_states(self):
+        self.mirror.sync_all()
+        wanting = self.server.questions[2]
+        wanting.update(state='complete', timestamp='2010-01-01 00:00:05',
+                       judgments=[{'user': {'fb_user_id': '/user/c'}, 'value': 'yes'}])
+        self.assertEqual(self.mirror.sync_all(), 1)
+        self.assertEqual(self.mirror.counts(), {'complete': 4})
+        self.assertEqual(self.ids(self.mirror.query(user='/user/c', value='yes')),
+                         ['/rabj/store/questions/q02'])
+
+    def test_inherited_iter_all(self):
+        self.assertEqual(self.ids(self.mirror.iter_all(self.queue, 'complete', True)),
+                         ['/rabj/store/questions/q%02i' % i for i in (0, 1, 3)])
+        self.assertEqual(len(list(self.queue.iter_all(state='complete', judgments=True,
+                                                       store=self.mirror))), 3)
+
+if __name__ == '__main__':
+    unittest.main()
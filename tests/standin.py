@@ -0,0 +1,167 @@
+'''
+standin.py
+
+A stand-in rabj server holding a single queue, for tests which need the
+paging, since and state behaviour of the question listings
+'''
+import BaseHTTPServer, SocketServer, re, threading, urlparse
+from rabj import api, simple
+from rabj.util import json
+
+QUEUE = '/rabj/store/queues/q1'
+ACCESS_KEY = 'k'
+
+def question(n, timestamp, state='complete', tags=(), judgments=()):
+    """A question as served by the stand-in, judgments are (user, value)
+    pairs"""
+    return { 'id': '/rabj/store/questions/q%02i' % n, 'timestamp': timestamp,
+             'state': state, 'tags': list(tags), 'assertion': 'assertion %i' % n,
+             'judgments': [ {'user': {'fb_user_id': user}, 'value': value}
+                            for user, value in judgments ] }
+
+class StandInHandler(BaseHTTPServer.BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    def log_message(self, *args):
+        pass
+
+    def send(self, result, code=200):
+        envelope = {'status': {'code': code}, 'result': result}
+        if code != 200:
+            envelope['error'] = {'code': code, 'class': code == 404 and 'NotFound' or 'ServerError',
+                                 'detail': {'msg': "%s not found" % self.path}}
+        body = json.dumps(envelope)
+        self.send_response(code)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        server = self.server
+        url = urlparse.urlsplit(self.path)
+        params = urlparse.parse_qs(url.query)
+        path = re.sub('/+', '/', url.path).rstrip('/')
+        server.requests.append(self.path)
+        if server.fail is not None and server.fail('GET', path, params):
+            return self.send(None, 500)
+        if path == QUEUE:
+            return self.send(server.meta)
+
+        if path == QUEUE + '/status':
+            states = [ q['state'] for q in server.questions ]
+            return self.send({'id': QUEUE, 'status': {'complete': states.count('complete'),
+                                                      'wanting': states.count('wanting')}})
+
+        if path.startswith(QUEUE + '/questions'):
+            state = path[len(QUEUE + '/questions'):].strip('/')
+            found = sorted(server.questions, key=lambda q: (q['timestamp'], q['id']))
+            if state:
+                found = [ q for q in found if q['state'] == state ]
+            if 'since' in params:
+                found = [ q for q in found if q['timestamp'] >= params['since'][0] ]
+            offset = int(params.get('offset', ['0'])[0])
+            limit = int(params.get('limit', ['1000'])[0])
+            page = []
+            for q in found[offset:offset + limit]:
+                q = dict(q)
+                if 'judgments' not in params:
+                    del q['judgments']
+                if 'body' not in params:
+                    q = dict((k, v) for k, v in q.items() if k in ('id', 'judgments'))
+                page.append(q)
+            return self.send({'id': QUEUE, 'questions': page})
+
+        for q in server.questions:
+            if path == q['id']:
+                return self.send(q)
+        self.send(None, 404)
+
+    def do_POST(self):
+        server = self.server
+        body = json.loads(self.rfile.read(int(self.headers['Content-Length'])))
+        path = re.sub('/+', '/', urlparse.urlsplit(self.path).path).rstrip('/')
+        server.requests.append(self.path)
+        if path == QUEUE + '/questions':
+            added = []
+            for q in body['questions']:
+                n = len(server.questions)
+                added.append(dict(question(n, '2010-01-02 00:00:%02i' % n, 'wanting'), **q))
+            server.questions.extend(added)
+            return self.send({'id': QUEUE, 'questions': added})
+        self.send(None, 404)
+
+    def do_PUT(self):
+        server = self.server
+        body = json.loads(self.rfile.read(int(self.headers['Content-Length'])))
+        path = re.sub('/+', '/', urlparse.urlsplit(self.path).path)
+        server.requests.append(self.path)
+        server.bodies.append((path.rstrip('/'), body))
+        if path.rstrip('/') == QUEUE:
+            server.meta.update(body['queue'])
+            return self.send(server.meta)
+
+        for q in server.questions:
+            if path.rstrip('/') == q['id']:
+                for key, value in body['question'].items():
+                    if value is None:
+                        q.pop(key, None)
+                    else:
+                        q[key] = value
+                return self.send(q)
+            if path.startswith(q['id'] + '/state/'):
+                q['state'] = body['state']
+                return self.send({'id': q['id'], 'state': q['state']})
+        self.send(None, 404)
+
+    def do_DELETE(self):
+        server = self.server
+        body = json.loads(self.rfile.read(int(self.headers['Content-Length'])))
+        path = re.sub('/+', '/', urlparse.urlsplit(self.path).path).rstrip('/')
+        server.requests.append(self.path)
+        if server.fail is not None and server.fail('DELETE', path, body):
+            return self.send(None, 500)
+        if path == QUEUE + '/questions':
+            ids = set(q['id'] for q in body['questions']) - server.stuck
+            server.questions = [ q for q in server.questions if q['id'] not in ids ]
+            return self.send({'id': QUEUE, 'removed': len(ids)})
+        server.deleted.append(path)
+        self.send({'id': path})
+
+class StandInServer(SocketServer.ThreadingMixIn, BaseHTTPServer.HTTPServer):
+    """Serves questions, a list of question dicts which may be changed
+    between requests. The paths requested are recorded in requests and the
+    decoded bodies of PUT requests in bodies, as (path, body) pairs. If
+    fail is set, requests for which fail(method, path, params) is true are
+    answered with a server error. Removing questions from the queue
+    leaves those whose ids are in stuck, deleted question ids are recorded
+    in deleted. connections counts the connections accepted"""
+    daemon_threads = True
+
+    def __init__(self, questions=()):
+        BaseHTTPServer.HTTPServer.__init__(self, ('127.0.0.1', 0), StandInHandler)
+        self.questions = list(questions)
+        self.meta = {'id': QUEUE, 'name': 'stand-in', 'access_key': ACCESS_KEY}
+        self.requests = []
+        self.bodies = []
+        self.fail = None
+        self.stuck = set()
+        self.deleted = []
+        self.connections = 0
+        self.url = 'http://127.0.0.1:%i/' % self.server_address[1]
+        thread = threading.Thread(target=self.serve_forever)
+        thread.setDaemon(True)
+        thread.start()
+
+    def process_request(self, request, client_address):
+        self.connections += 1
+        SocketServer.ThreadingMixIn.process_request(self, request, client_address)
+
+    def queue(self):
+        """The stand-in queue as a RabjQueue"""
+        return simple.RabjServer(self.url).get_queue(QUEUE, access_key=ACCESS_KEY)
+
+    def stop(self):
+        api.transport_for(self.url).clear()
+        self.shutdown()
+        self.server_close()
@@ -0,0 +1,48 @@
+# -*- coding: utf-8 -*-
+import cStringIO, unittest
+from rabj.util import json, JsonStreamDecoder
+
+DOCUMENT = {
+    'status': {'code': 200, 'questions': ['decoy']},
+    'result': {
+        'meta': {'questions': [{'id': '/decoy'}]},
+        'questions': [
+            {'id': '/q/1', 'assertion': 'brackets ] [ { } and "quotes" \\ inside'},
+            {'id': '/q/2', 'tags': [], 'nested': {'questions': [1, [2, [3]]]}},
+            123456789,
+            -1.5e3,
+            u'caf\xe9 ☃',
+            [],
+            {},
+            None,
+            True,
+        ],
+        'after': {'questions': 'not an array'},
+    },
+}
+
+class JsonStreamDecoderTest(unittest.TestCase):
+    def decode(self, text, chunksize):
+        decoder = JsonStreamDecoder(cStringIO.StringIO(text).read, ('result', 'questions'),
+                                    chunksize)
+        return list(decoder), decoder.envelope
+
+    def test_chunk_boundaries(self):
+        text = json.dumps(DOCUMENT, ensure_ascii=False).encode('utf-8')
+        envelope = json.loads(json.dumps(DOCUMENT))
+        envelope['result']['questions'] = []
+        for chunksize in (1, 2, 3, 7, 64 * 1024):
+            items, decoded = self.decode(text, chunksize)
+            self.assertEqual(items, DOCUMENT['result']['questions'], "chunksize %i" % chunksize)
+            self.assertEqual(decoded, envelope, "chunksize %i" % chunksize)
+
+    def test_whitespace_and_empty_array(self):
+        text = ' {\n "result" : {\n  "questions" : [ \n ] \n }\n} '
+        for chunksize in (1, 3):
+            self.assertEqual(self.decode(text, chunksize), ([], {'result': {'questions': []}}))
+
+    def test_unterminated_array(self):
+        self.assertRaises(ValueError, self.decode, '{"result": {"questions": [1, 2', 2)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,51 @@
+import threading, unittest
+from rabj import api
+import standin
+
+class RabjTransportTest(unittest.TestCase):
+    def setUp(self):
+        self.server = standin.StandInServer(
+            [ standin.question(n, '2010-01-01 00:00:%02i' % n) for n in range(3) ])
+        self.rabj = api.RabjCallable(self.server.url, access_key=standin.ACCESS_KEY)
+
+    def tearDown(self):
+        self.server.stop()
+
+    def test_derived_callables_share_the_transport(self):
+        transport = api.transport_for(self.server.url)
+        self.assertTrue(self.rabj._transport is transport)
+        self.assertTrue(api.transport_for(self.server.url + 'rabj/store/') is transport)
+        queue = self.rabj.rabj.store['queues/q1']
+        self.assertTrue(queue._transport is transport)
+        self.assertTrue(queue.for_path('/rabj/store/questions/q00')._transport is transport)
+        resp, result = queue.get()
+        self.assertTrue(result.rabjcallable._transport is transport)
+
+    def test_connections_are_reused(self):
+        queue = self.rabj.for_path(standin.QUEUE)
+        for i in range(5):
+            resp, result = queue.get()
+            self.assertEqual(result['id'], standin.QUEUE)
+        self.assertEqual(self.server.connections, 1)
+
+    def test_requests_from_many_threads(self):
+        transport = api.RabjTransport(self.server.url, maxsize=4)
+        queue = api.RabjCallable(self.server.url, standin.ACCESS_KEY, transport).for_path(
+            standin.QUEUE)
+        results = []
+        def get():
+            for i in range(5):
+                resp, result = queue.questions.get()
+                results.append(len(result['questions']))
+        threads = [ threading.Thread(target=get) for i in range(8) ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(results, [3] * 40)
+        self.assertTrue(0 < len(transport._idle) <= 4, transport._idle)
+        transport.clear()
+        self.assertEqual(transport._idle, [])
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,83 @@
+import socket, unittest
+from rabj import tuning
+import standin
+
+class Response(object):
+    size = 1000
+
+class PageSizerTest(unittest.TestCase):
+    def setUp(self):
+        self.sizer = tuning.PageSizer(initial=100, minimum=10, probe_after=2)
+
+    def test_grows_while_time_per_question_falls(self):
+        self.sizer.success(100, 1.0)
+        self.assertEqual(self.sizer.size, 200)
+        self.sizer.success(200, 1.5)
+        self.assertEqual(self.sizer.size, 400)
+
+    def test_short_page_is_ignored(self):
+        self.sizer.success(100, 0.01, count=10)
+        self.assertEqual(self.sizer.size, 100)
+        self.assertEqual(len(self.sizer.history), 1)
+
+    def test_steps_back_and_holds_when_latency_rises(self):
+        self.sizer.success(100, 1.0)
+        self.sizer.success(200, 8.0)
+        self.assertEqual(self.sizer.size, 100)
+        # held below the ceiling for probe_after requests, then probed again
+        self.sizer.success(100, 1.0)
+        self.sizer.success(100, 1.0)
+        self.assertEqual(self.sizer.size, 100)
+        self.sizer.success(100, 1.0)
+        self.assertEqual(self.sizer.size, 200)
+
+    def test_shrinks_slow_and_large_requests(self):
+        self.sizer.success(100, 60.0)
+        self.assertEqual(self.sizer.size, 50)
+        self.sizer.success(50, 0.1, nbytes=self.sizer.max_bytes * 5)
+        self.assertEqual(self.sizer.size, 10)
+
+    def test_failure_backs_off(self):
+        self.sizer.failure(100, socket.timeout())
+        self.assertEqual(self.sizer.size, 50)
+        self.assertEqual(self.sizer.history[-1], (100, None, None, False))
+
+    def test_call_retries_with_smaller_sizes(self):
+        sizes = []
+        def func(size):
+            sizes.append(size)
+            if len(sizes) < 3:
+                raise socket.timeout()
+            return Response(), {'questions': range(size)}
+        size, (resp, result) = self.sizer.call(func)
+        self.assertEqual(sizes, [100, 50, 25])
+        self.assertEqual(size, 25)
+        self.assertEqual(len(result['questions']), 25)
+
+    def test_call_limit_and_errors(self):
+        sizes = []
+        def func(size):
+            sizes.append(size)
+            raise socket.timeout()
+        self.assertRaises(socket.timeout, self.sizer.call, func, 80)
+        self.assertEqual(sizes, [80, 40, 20, 10])
+
+        def broken(size):
+            raise ValueError(size)
+        self.assertRaises(ValueError, self.sizer.call, broken)
+
+class AutoPageSizeTest(unittest.TestCase):
+    def setUp(self):
+        self.server = standin.StandInServer(
+            [ standin.question(n, '2010-01-01 00:00:%02i' % n) for n in range(23) ])
+        self.queue = self.server.queue()
+
+    def tearDown(self):
+        self.server.stop()
+
+    def test_short_queue_does_not_grow_the_size(self):
+        self.assertEqual(len(self.queue.get_all(pagesize='auto')), 23)
+        self.assertEqual(self.queue.read_sizer.size, 500)
+
+if __name__ == '__main__':
+    unittest.main()
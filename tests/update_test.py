@@ -0,0 +1,76 @@
+import unittest
+from rabj import api, simple
+import standin
+
+def qid(n):
+    return '/rabj/store/questions/q%02i' % n
+
+class UpdateTest(unittest.TestCase):
+    def setUp(self):
+        self.server = standin.StandInServer(
+            [ standin.question(n, '2010-01-01 00:00:%02i' % n, tags=['a']) for n in range(3) ])
+        self.queue = self.server.queue()
+
+    def tearDown(self):
+        self.server.stop()
+
+    def test_question_update_sends_changes(self):
+        question = self.queue.get_one(qid(0))
+        self.assertTrue(question.update() is question)
+        self.assertEqual(self.server.bodies, [])
+
+        question['tags'].append('b')
+        del question['assertion']
+        question.update()
+        self.assertEqual(self.server.bodies,
+                         [(qid(0), {'question': {'id': qid(0), 'tags': ['a', 'b'],
+                                                 'assertion': None}})])
+        self.assertEqual(question.dirty, frozenset())
+        self.assertEqual(self.server.questions[0]['tags'], ['a', 'b'])
+        self.assertFalse('assertion' in self.server.questions[0])
+
+    def test_question_update_full(self):
+        question = self.queue.get_one(qid(1))
+        question.update(full=True)
+        path, body = self.server.bodies[0]
+        self.assertEqual(body['question'], self.server.questions[1])
+
+    def test_queue_update(self):
+        self.queue.update()
+        self.assertEqual(self.server.bodies, [])
+        self.queue['name'] = 'renamed'
+        self.queue.update()
+        self.assertEqual(self.server.bodies[0][1]['queue'],
+                         {'id': standin.QUEUE, 'name': 'renamed'})
+        self.assertEqual(self.queue['name'], 'renamed')
+
+    def test_update_many(self):
+        questions = self.queue.get_all()
+        questions[0]['tags'] = ['b']
+        plain = dict(self.server.questions[2], tags=['c'])
+        self.assertEqual(self.queue.update_many(questions[:2] + [plain], threads=2), 2)
+        self.assertEqual(sorted(self.server.bodies),
+                         [(qid(0), {'question': {'id': qid(0), 'tags': ['b']}}),
+                          (qid(2), {'question': plain})])
+        self.assertEqual(questions[0].dirty, frozenset())
+        self.assertEqual(self.server.questions[2]['tags'], ['c'])
+
+    def test_update_many_marks_wrapped_dicts_clean(self):
+        resp, result = self.queue.queue.questions.get(body=True)
+        page = result['questions']
+        page[1]['tags'] = ['b']
+        self.assertEqual(self.queue.update_many(page), 1)
+        self.assertEqual(page[1].dirty, frozenset())
+        self.assertEqual(self.server.bodies[0][0], qid(1))
+
+    def test_update_many_failures(self):
+        questions = [ dict(self.server.questions[0]), {'id': '/rabj/store/questions/missing'} ]
+        try:
+            self.queue.update_many(questions)
+            self.fail("no RabjBatchError")
+        except api.RabjBatchError, e:
+            self.assertEqual(e.results, 1)
+            self.assertEqual([ f[0] for f in e.failures ], ['/rabj/store/questions/missing'])
+
+if __name__ == '__main__':
+    unittest.main()
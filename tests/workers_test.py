@@ -0,0 +1,131 @@
+import threading, time, unittest
+from rabj import api, workers
+import standin
+
+def qid(n):
+    return '/rabj/store/questions/q%02i' % n
+
+class Counted(object):
+    """An iterable over range(n) which counts the items taken from it"""
+    def __init__(self, n):
+        self.n = n
+        self.taken = 0
+
+    def __iter__(self):
+        for i in range(self.n):
+            self.taken += 1
+            yield i
+
+def slow_square(i):
+    time.sleep(0.01 * (i % 3))
+    if i == 5:
+        raise ValueError(i)
+    return i * i
+
+class RunTest(unittest.TestCase):
+    def test_ordered(self):
+        results = list(workers.run(slow_square, range(8), 4))
+        self.assertEqual([ item for item, result, exc in results ], range(8))
+        self.assertEqual([ result for item, result, exc in results if exc is None ],
+                         [ i * i for i in range(8) if i != 5 ])
+
+    def test_unordered(self):
+        results = list(workers.run(slow_square, range(8), 4, ordered=False))
+        self.assertEqual(sorted(item for item, result, exc in results), range(8))
+
+    def test_errors_are_yielded(self):
+        for threads in (1, 4):
+            failed = [ (item, exc[0]) for item, result, exc in workers.run(slow_square, range(8),
+                                                                          threads)
+                       if exc is not None ]
+            self.assertEqual(failed, [(5, ValueError)])
+
+    def test_imap_raises_in_place(self):
+        seen = []
+        def consume():
+            for result in workers.imap(slow_square, range(8), 4):
+                seen.append(result)
+        self.assertRaises(ValueError, consume)
+        self.assertEqual(seen, [0, 1, 4, 9, 16])
+
+    def test_window_bounds_items_taken(self):
+        items = Counted(50)
+        ahead = []
+        for item, result, exc in workers.run(slow_square, items, 3, window=4):
+            ahead.append(items.taken - item - 1)
+        self.assertTrue(max(ahead) <= 4, ahead)
+
+    def test_stopping_early(self):
+        items = Counted(1000)
+        before = threading.activeCount()
+        results = workers.run(slow_square, items, 4)
+        for i in range(3):
+            results.next()
+        results.close()
+        self.assertTrue(items.taken <= 3 + 8, items.taken)
+        time.sleep(0.2)
+        self.assertEqual(threading.activeCount(), before)
+
+class PrefetchTest(unittest.TestCase):
+    def test_items_in_order(self):
+        self.assertEqual(list(workers.prefetch(iter(range(10)), 3)), range(10))
+
+    def test_depth_bounds_items_taken(self):
+        items = Counted(10)
+        prefetched = workers.prefetch(items, 2)
+        self.assertEqual(prefetched.next(), 0)
+        time.sleep(0.2)
+        # the item in use and no more than depth beyond it
+        self.assertEqual(items.taken, 3)
+        self.assertEqual(list(prefetched), range(1, 10))
+
+    def test_errors_in_place(self):
+        def failing():
+            yield 1
+            raise ValueError()
+        prefetched = workers.prefetch(failing(), 2)
+        self.assertEqual(prefetched.next(), 1)
+        self.assertRaises(ValueError, prefetched.next)
+
+    def test_stopping_early(self):
+        items = Counted(1000)
+        prefetched = workers.prefetch(items, 2)
+        prefetched.next()
+        prefetched.close()
+        time.sleep(0.3)
+        self.assertTrue(items.taken <= 3, items.taken)
+
+class IterPagesTest(unittest.TestCase):
+    def setUp(self):
+        self.server = standin.StandInServer(
+            [ standin.question(n, '2010-01-01 00:00:%02i' % n) for n in range(10) ])
+        self.queue = self.server.queue()
+
+    def tearDown(self):
+        self.server.stop()
+
+    def ids(self, questions):
+        return [ q['id'] for q in questions ]
+
+    def test_concurrent_pages_in_order(self):
+        self.assertEqual(self.ids(self.queue.iter_all(pagesize=3, threads=3)),
+                         [ qid(n) for n in range(10) ])
+        offsets = sorted(path for path in self.server.requests if 'offset=' in path)
+        self.assertEqual(len(offsets), 4)
+
+    def test_queue_grown_since_planned(self):
+        self.queue._state_count = lambda state: 5
+        self.assertEqual(self.ids(self.queue.iter_all(pagesize=3, threads=3)),
+                         [ qid(n) for n in range(10) ])
+
+    def test_error_propagates(self):
+        self.server.fail = lambda method, path, params: params.get('offset') == ['3']
+        self.assertRaises(api.RabjError, list, self.queue.iter_all(pagesize=3, threads=3))
+
+    def test_stopping_early(self):
+        questions = self.queue.iter_all(pagesize=1, threads=2)
+        self.assertEqual(questions.next()['id'], qid(0))
+        questions.close()
+
+if __name__ == '__main__':
+    unittest.main()